@@ -0,0 +1,141 @@
+"""
+Benchmark: schema-driven flatten_whoop vs. the original json_normalize flatten.
+
+Generates 5 years of synthetic Whoop V2 records (same shape as the API) and
+times both engines on a weekly, monthly and quarterly window.
+
+Usage: python benchmarks/bench_flatten.py [--years 5] [--repeat 5]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import pandas as pd
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from biostack_analyst import flatten_whoop, clean_whoop_cycles
+
+def legacy_flatten_and_filter(data_list, start_date, end_date):
+    """ The pre-schema implementation, kept verbatim as the baseline """
+    if not data_list or not isinstance(data_list, list):
+        return pd.DataFrame()
+
+    df = pd.json_normalize(data_list, sep='_')
+    df.columns = [c.replace('score_', '').replace('stage_summary_', '').lower() for c in df.columns]
+
+    date_col = None
+    candidates = ['start', 'created_at', 'date', 'entrydate', 'cycle']
+    for c in df.columns:
+        if any(name in c for name in candidates):
+            date_col = c
+            if 'start' in c or 'date' in c: break
+
+    if not date_col:
+        return df
+
+    try:
+        df[date_col] = pd.to_datetime(df[date_col], errors='coerce').dt.tz_localize(None)
+        df['day_str'] = df[date_col].dt.strftime('%Y-%m-%d')
+
+        start = pd.to_datetime(start_date).replace(tzinfo=None)
+        end = pd.to_datetime(end_date).replace(tzinfo=None) + timedelta(days=1)
+
+        mask = (df[date_col] >= start) & (df[date_col] < end)
+        df_filtered = df.loc[mask].copy()
+        return df_filtered.sort_values(by=date_col)
+    except:
+        return df
+
+def iso(dt):
+    return dt.strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+def synthetic_whoop(years, seed=7):
+    rng = random.Random(seed)
+    end = datetime(2025, 12, 31, 6, 0)
+    days = years * 365
+    data = {'cycles': [], 'recovery': [], 'sleep': [], 'workouts': []}
+    for i in range(days):
+        day = end - timedelta(days=i)
+        cycle_id, sleep_id = 10_000_000 + i, f"sleep-{i:06d}"
+        stamp = {'created_at': iso(day), 'updated_at': iso(day + timedelta(hours=2)), 'user_id': 1}
+        data['cycles'].append({
+            'id': cycle_id, **stamp, 'start': iso(day), 'end': iso(day + timedelta(hours=24)),
+            'timezone_offset': '-05:00', 'score_state': 'SCORED',
+            'score': {'strain': rng.uniform(4, 20), 'kilojoule': rng.uniform(6000, 16000),
+                      'average_heart_rate': rng.randint(55, 80), 'max_heart_rate': rng.randint(120, 190)}
+        })
+        data['recovery'].append({
+            'cycle_id': cycle_id, 'sleep_id': sleep_id, **stamp, 'score_state': 'SCORED',
+            'score': {'user_calibrating': False, 'recovery_score': rng.randint(10, 99),
+                      'resting_heart_rate': rng.randint(45, 65), 'hrv_rmssd_milli': rng.uniform(30, 120),
+                      'spo2_percentage': rng.uniform(94, 99), 'skin_temp_celsius': rng.uniform(33, 35)}
+        })
+        data['sleep'].append({
+            'id': sleep_id, 'cycle_id': cycle_id, **stamp, 'start': iso(day - timedelta(hours=8)), 'end': iso(day),
+            'timezone_offset': '-05:00', 'nap': False, 'score_state': 'SCORED',
+            'score': {
+                'stage_summary': {'total_in_bed_time_milli': rng.randint(21_600_000, 32_400_000),
+                                  'total_awake_time_milli': rng.randint(600_000, 3_600_000),
+                                  'total_light_sleep_time_milli': rng.randint(9_000_000, 14_000_000),
+                                  'total_slow_wave_sleep_time_milli': rng.randint(3_000_000, 7_000_000),
+                                  'total_rem_sleep_time_milli': rng.randint(4_000_000, 8_000_000),
+                                  'sleep_cycle_count': rng.randint(3, 6), 'disturbance_count': rng.randint(2, 15)},
+                'sleep_needed': {'baseline_milli': 27_000_000, 'need_from_sleep_debt_milli': 0,
+                                 'need_from_recent_strain_milli': 0, 'need_from_recent_nap_milli': 0},
+                'respiratory_rate': rng.uniform(13, 17), 'sleep_performance_percentage': rng.randint(50, 100),
+                'sleep_consistency_percentage': rng.randint(50, 100), 'sleep_efficiency_percentage': rng.uniform(80, 98)
+            }
+        })
+        for w in range(rng.choice([0, 1, 1, 2])):
+            data['workouts'].append({
+                'id': f"workout-{i:06d}-{w}", **stamp, 'start': iso(day + timedelta(hours=10 + w * 4)),
+                'end': iso(day + timedelta(hours=11 + w * 4)), 'timezone_offset': '-05:00',
+                'sport_name': rng.choice(['running', 'weightlifting', 'cycling']), 'score_state': 'SCORED',
+                'score': {'strain': rng.uniform(5, 18), 'average_heart_rate': rng.randint(100, 160),
+                          'max_heart_rate': rng.randint(150, 195), 'kilojoule': rng.uniform(800, 3000),
+                          'percent_recorded': 100, 'distance_meter': rng.uniform(0, 15000),
+                          'zone_durations': {f"zone_{z}_milli": rng.randint(0, 900_000) for z in
+                                             ['zero', 'one', 'two', 'three', 'four', 'five']}}
+            })
+    return data, end
+
+def best_of(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    data, end = synthetic_whoop(args.years)
+    total = sum(len(v) for v in data.values())
+    print(f"📦 Synthetic Whoop: {args.years} years, {total} records")
+
+    for days in [7, 30, 90]:
+        start = end - timedelta(days=days)
+
+        def legacy():
+            for category, records in data.items():
+                df = legacy_flatten_and_filter(records, start, end)
+                if category != 'workouts': clean_whoop_cycles(df)
+
+        def schema():
+            for category, records in data.items():
+                df = flatten_whoop(category, records, start, end)
+                if category != 'workouts': clean_whoop_cycles(df)
+
+        t_legacy = best_of(legacy, args.repeat)
+        t_schema = best_of(schema, args.repeat)
+        print(f"   {days:>3}-day window | legacy {t_legacy * 1000:8.1f} ms | schema {t_schema * 1000:7.1f} ms "
+              f"| {t_legacy / t_schema:5.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,140 @@
 import os
+import re
+import glob
 import json
+import time
+import hashlib
 import boto3
 import argparse
 import pandas as pd
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
+import biostack_correlate
+import biostack_lake
+import biostack_rollup
+import biostack_storage
+import biostack_tweets
+
 load_dotenv()
 
 BUCKET_NAME = os.getenv('BIOSTACK_BUCKET_NAME')
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+SOURCES = ['whoop', 'nutrition', 'vitals', 'social']
+WHOOP_CATEGORIES = ['cycles', 'recovery', 'sleep', 'workouts']
+# Sleep/recovery of a cycle are logged the night before its start: these sources load a day earlier
+# (on S3 all Whoop categories share one object, so the whole 'whoop' source is widened)
+LOAD_LEAD_DAYS = {'whoop': 1, 'whoop_recovery': 1, 'whoop_sleep': 1}
+# Sheet exports (MyNetDiary, Google Sheets) may use locale formats; ISO 8601 is always tried first
+DATE_FORMATS = ['%Y-%m-%d %H:%M:%S', '%m/%d/%Y', '%m/%d/%Y %H:%M:%S', '%Y/%m/%d', '%d.%m.%Y']
+
+# Explicit flatten schema per Whoop category: output column -> path into the raw V2 record
+WHOOP_SCHEMAS = {
+    'cycles': {
+        'date': 'start',
+        'columns': {
+            'id': ('id',), 'start': ('start',), 'end': ('end',),
+            'strain': ('score', 'strain'), 'kilojoule': ('score', 'kilojoule'),
+            'average_heart_rate': ('score', 'average_heart_rate'), 'max_heart_rate': ('score', 'max_heart_rate')
+        }
+    },
+    'recovery': {
+        'date': 'created_at',
+        'columns': {
+            'cycle_id': ('cycle_id',), 'sleep_id': ('sleep_id',), 'created_at': ('created_at',),
+            'recovery_score': ('score', 'recovery_score'), 'resting_heart_rate': ('score', 'resting_heart_rate'),
+            'hrv_rmssd_milli': ('score', 'hrv_rmssd_milli'), 'spo2_percentage': ('score', 'spo2_percentage'),
+            'skin_temp_celsius': ('score', 'skin_temp_celsius')
+        }
+    },
+    'sleep': {
+        'date': 'start',
+        'columns': {
+            'id': ('id',), 'cycle_id': ('cycle_id',), 'start': ('start',), 'end': ('end',), 'nap': ('nap',),
+            'total_in_bed_time_milli': ('score', 'stage_summary', 'total_in_bed_time_milli'),
+            'total_awake_time_milli': ('score', 'stage_summary', 'total_awake_time_milli'),
+            'total_light_sleep_time_milli': ('score', 'stage_summary', 'total_light_sleep_time_milli'),
+            'total_slow_wave_sleep_time_milli': ('score', 'stage_summary', 'total_slow_wave_sleep_time_milli'),
+            'total_rem_sleep_time_milli': ('score', 'stage_summary', 'total_rem_sleep_time_milli'),
+            'disturbance_count': ('score', 'stage_summary', 'disturbance_count'),
+            'respiratory_rate': ('score', 'respiratory_rate'),
+            'sleep_performance_percentage': ('score', 'sleep_performance_percentage'),
+            'sleep_consistency_percentage': ('score', 'sleep_consistency_percentage'),
+            'sleep_efficiency_percentage': ('score', 'sleep_efficiency_percentage')
+        }
+    },
+    'workouts': {
+        'date': 'start',
+        'columns': {
+            'id': ('id',), 'start': ('start',), 'end': ('end',), 'sport_name': ('sport_name',),
+            'strain': ('score', 'strain'), 'kilojoule': ('score', 'kilojoule'),
+            'average_heart_rate': ('score', 'average_heart_rate'), 'max_heart_rate': ('score', 'max_heart_rate'),
+            'distance_meter': ('score', 'distance_meter')
+        }
+    }
+}
+
+# --- PROMPT ENCODINGS ---
+# records:  [{"col":v,...},...]                 (column names repeated on every row)
+# columnar: {"columns":[...],"data":[[...],...]} (header once, then value arrays)
+# csv:      header line + comma-separated rows
+# delta:    columnar, day_str replaced by +days since previous row (base date in header)
+ENCODINGS = ['records', 'columnar', 'csv', 'delta']
+
+# Decimals per column (exact name first, then substring rules, else DEFAULT_DECIMALS). 0 -> integer.
+ROUNDING = {
+    'strain': 1, 'workout_strain': 1, 'hours_sleep': 2, 'hrv_rmssd_milli': 1,
+    'spo2_percentage': 1, 'skin_temp_celsius': 1, 'respiratory_rate': 1
+}
+ROUNDING_RULES = [
+    ('kilojoule', 0), ('calories', 0), ('heart_rate', 0), ('percentage', 0), ('score', 0),
+    ('sodium', 0), ('protein', 1), ('fat', 1), ('carbs', 1), ('sugars', 1), ('fiber', 1)
+]
+DEFAULT_DECIMALS = 2
+TOKEN_PATTERN = re.compile(r"[A-Za-z]+|\d{1,3}|[^\sA-Za-z\d]")
+
+# --- FRAGMENT CACHE ---
+# Built blocks per source (+ their rendered text per encoding), keyed by source ETags,
+# date range and TRANSFORM_VERSION. Bump the version whenever flatten/aggregate/render output changes.
+FRAGMENT_DIR = os.path.join(PROJECT_ROOT, '.fragment_cache')
+FRAGMENT_TTL_DAYS = 14
+TRANSFORM_VERSION = 3
+
+# --- OUTPUT ---
+OUTPUT_FILE = 'biostack_prompt.txt'
+# Batch jobs write biostack_prompt_<start>_to_<end>_<template>.txt; the Drive courier uploads every match
+OUTPUT_GLOB = 'biostack_prompt*.txt'
+
+# --- TOKEN BUDGET ---
+# Reductions applied in this order (lowest priority first) until the brief fits --token-budget.
+# Keys are block names; a trailing '_' matches every block with that prefix (whoop_daily, whoop_sleep, ...).
+# Every step is applied to the untrimmed block, so each label states what is actually kept.
+TRIM_PLAN = [
+    ('social_expert_feed', [('newest 50%', 'newest', 0.5), ('newest 20%', 'newest', 0.2), ('dropped', 'drop', None)]),
+    ('nutrition_raw_log', [('top 40 foods', 'top_foods', 40), ('top 15 foods', 'top_foods', 15), ('dropped', 'drop', None)]),
+    ('vitals', [('newest 50%', 'newest', 0.5), ('newest 25%', 'newest', 0.25)]),
+    ('whoop_', [('newest 50%', 'newest', 0.5), ('newest 25%', 'newest', 0.25)]),
+    ('nutrition_daily_totals', [('newest 50%', 'newest', 0.5), ('newest 25%', 'newest', 0.25)])
+]
+
+# Load phase: sources are fetched + decoded concurrently over one pooled client
+LOAD_WORKERS = 8
+
+# Columns the analyst actually uses per lake source (None = all). Parquet only reads these.
+LAKE_COLUMNS = {
+    'whoop_cycles': ['id', 'start', 'end', 'score_strain', 'score_kilojoule', 'score_average_heart_rate',
+                     'score_max_heart_rate'],
+    'whoop_recovery': ['cycle_id', 'sleep_id', 'created_at', 'score_recovery_score', 'score_hrv_rmssd_milli',
+                       'score_resting_heart_rate', 'score_spo2_percentage', 'score_skin_temp_celsius'],
+    'whoop_sleep': ['id', 'cycle_id', 'start', 'nap', 'score_sleep_performance_percentage',
+                    'score_sleep_efficiency_percentage', 'score_stage_summary_total_in_bed_time_milli',
+                    'score_respiratory_rate'],
+    'whoop_workouts': None,
+    'nutrition': None,
+    'vitals': None
+}
 
 def get_args():
     parser = argparse.ArgumentParser()
@@ -18,6 +144,26 @@ def get_args():
     # NEW ARGUMENT
     parser.add_argument('--template', type=str, default='templates/default_coach.txt', 
                         help='Path to text file containing prompt logic (must include {{DATASET}} placeholder)')
+    parser.add_argument('--lake', action='store_true',
+                        help='Read the partitioned Parquet lake instead of the latest JSON exports')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Bypass the local ETag-keyed S3 cache (.s3_cache/)')
+    parser.add_argument('--encoding', choices=ENCODINGS, default='records',
+                        help='Default <data> block encoding')
+    parser.add_argument('--block-encoding', action='append', default=[], metavar='BLOCK=ENCODING',
+                        help='Per-block override, e.g. --block-encoding nutrition_raw_log=csv (repeatable)')
+    parser.add_argument('--token-budget', type=int, default=None,
+                        help='Downsample low-priority blocks until the brief fits ~N tokens')
+    parser.add_argument('--no-baselines', action='store_true',
+                        help='Skip updating rollups/ and the 7/28/90-day baselines block')
+    parser.add_argument('--no-memo', action='store_true',
+                        help='Rebuild every <data> block instead of reusing .fragment_cache/')
+    parser.add_argument('--topics', type=str, default=None,
+                        help='Expert posts to include from the tweet archive, e.g. sleep,hrv,creatine '
+                             '(topics or plain words; default: every protocol topic)')
+    parser.add_argument('--job', action='append', default=[], metavar='DAYS[:TEMPLATE]',
+                        help='Batch mode: one brief per job from a single load, e.g. --job 7 --job 30 '
+                             '--job 7:templates/preston_coach.txt (repeatable; --days/--template are ignored)')
     return parser.parse_args()
 
 def get_s3_client():
@@ -25,60 +171,211 @@ def get_s3_client():
         's3',
         aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
         aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
-        region_name='us-east-1'
+        region_name='us-east-1',
+        # boto3 clients are thread-safe; size the pool so loaders never queue for a connection
+        config=Config(max_pool_connections=LOAD_WORKERS * 2)
     )
 
-def get_latest_file_content(s3, folder):
-    """ Reads newest S3 JSON file """
+def newest_object(s3, prefix):
+    """ Most recently modified object under a prefix (paginated, no 1000-key cap), None if empty """
+    latest = None
+    for page in s3.get_paginator('list_objects_v2').paginate(Bucket=BUCKET_NAME, Prefix=prefix):
+        for item in page.get('Contents', []):
+            if latest is None or item['LastModified'] > latest['LastModified']:
+                latest = item
+    return latest
+
+def get_latest_file_content(s3, folder, start_date, end_date):
+    """ Legacy fallback: streams the newest S3 JSON file under a prefix """
     try:
-        response = s3.list_objects_v2(Bucket=BUCKET_NAME, Prefix=folder)
-        if 'Contents' not in response:
-            return None 
-        files = sorted(response['Contents'], key=lambda x: x['LastModified'])
-        latest_file = files[-1]['Key']
-        print(f"   Reading {folder}: {latest_file}...")
-        
-        obj = s3.get_object(Bucket=BUCKET_NAME, Key=latest_file)
-        return json.loads(obj['Body'].read().decode('utf-8'))
+        latest = newest_object(s3, folder)
+        if latest is None:
+            return None
+        print(f"   Reading {folder}: {latest['Key']}...")
+        return biostack_storage.read_json_window(s3, BUCKET_NAME, latest['Key'], start_date, end_date,
+                                                 etag=latest.get('ETag', '').strip('"'))
     except Exception as e:
         print(f"⚠️  Error reading {folder}: {e}")
         return None
 
+def get_range_content(s3, folder, start_date, end_date):
+    """ Resolves the objects covering the window through the source manifest (one GET) """
+    try:
+        payload, keys = biostack_storage.load_range(s3, BUCKET_NAME, folder, start_date, end_date)
+    except Exception as e:
+        print(f"⚠️  Error reading {folder} manifest: {e}")
+        payload, keys = None, None
+    if keys is None:
+        # No manifest yet (data written before manifests existed)
+        return get_latest_file_content(s3, folder, start_date, end_date)
+    print(f"   Reading {folder}: {', '.join(keys) if keys else 'nothing covers this range'}")
+    return payload
+
+def load_sources(loaders):
+    """ Runs {name: fn} loaders concurrently and reports wall-clock time per source """
+    def timed(fn):
+        t0 = time.perf_counter()
+        result = fn()
+        return result, time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    results, timings = {}, {}
+    with ThreadPoolExecutor(max_workers=max(1, min(LOAD_WORKERS, len(loaders)))) as pool:
+        futures = {name: pool.submit(timed, fn) for name, fn in loaders.items()}
+        for name, future in futures.items():
+            results[name], timings[name] = future.result()
+
+    per_source = ", ".join(f"{name} {secs:.2f}s" for name, secs in timings.items())
+    print(f"⏱️  Load phase: {per_source} | wall {time.perf_counter() - t0:.2f}s")
+    return results
+
+def load_social(s3, start_date, end_date, topics=None):
+    """ Protocol-relevant posts from the tweet archive; legacy snapshots if there is no archive yet """
+    try:
+        payload = biostack_tweets.search(s3, BUCKET_NAME, topics=topics or list(biostack_tweets.TOPICS),
+                                         start=start_date, end=end_date)
+    except Exception as e:
+        print(f"⚠️  Error reading tweets archive: {e}")
+        payload = None
+    if payload is None:
+        return get_range_content(s3, 'social', start_date, end_date)
+    return payload
+
+def load_start(source, start_date):
+    return start_date - timedelta(days=LOAD_LEAD_DAYS.get(source, 0))
+
+def load_from_s3(s3, start_date, end_date, sources=SOURCES, topics=None):
+    loaders = {src: (lambda src=src: get_range_content(s3, src, load_start(src, start_date), end_date))
+               for src in sources}
+    if 'social' in loaders:
+        loaders['social'] = lambda: load_social(s3, start_date, end_date, topics)
+    return load_sources(loaders)
+
+def load_from_lake(s3, start_date, end_date, topics=None):
+    """ Reads only the month partitions + columns covering the window (social stays on JSON) """
+    def records(source):
+        try:
+            df = biostack_lake.read_range(s3, BUCKET_NAME, source, load_start(source, start_date), end_date,
+                                          columns=LAKE_COLUMNS[source])
+        except Exception as e:
+            print(f"⚠️  Error reading lake/{source}: {e}")
+            return None
+        print(f"   Reading lake/{source}: {len(df)} rows...")
+        return df
+
+    lake_sources = [f"whoop_{c}" for c in WHOOP_CATEGORIES] + ['nutrition', 'vitals']
+    loaders = {src: (lambda src=src: records(src)) for src in lake_sources}
+    loaders['social'] = lambda: load_social(s3, start_date, end_date, topics)
+    loaded = load_sources(loaders)
+    return {
+        'whoop': {c: loaded[f"whoop_{c}"] for c in WHOOP_CATEGORIES},
+        'nutrition': loaded['nutrition'],
+        'vitals': loaded['vitals'],
+        'social': loaded['social']
+    }
+
 # --- POWER TOOLS: PRE-PROCESSING FUNCTIONS ---
 
-def flatten_and_filter(data_list, start_date, end_date):
+def has_data(payload):
+    """ Raw payloads are lists/dicts (JSON) or DataFrames (lake) """
+    if payload is None: return False
+    return not payload.empty if isinstance(payload, pd.DataFrame) else bool(payload)
+
+def window_days(start_date, end_date):
+    """ Inclusive 'YYYY-MM-DD' bounds; ISO day strings compare correctly as plain strings """
+    return start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')
+
+def parse_dates(series):
+    """ Known formats only: ISO 8601 (Whoop, our own exports) first, then common sheet formats """
+    parsed = pd.to_datetime(series, format='ISO8601', errors='coerce', utc=True)
+    for fmt in DATE_FORMATS:
+        missing = parsed.isna() & series.notna()
+        if not missing.any(): break
+        parsed = parsed.fillna(pd.to_datetime(series[missing], format=fmt, errors='coerce', utc=True))
+    return parsed.dt.tz_localize(None)
+
+def dig(record, path):
+    for step in path:
+        if not isinstance(record, dict): return None
+        record = record.get(step)
+    return record
+
+def flatten_whoop(category, data, start_date, end_date):
     """
-    1. Converts dict-of-dicts to flat DataFrame using json_normalize
-    2. Intelligent Date filtering
+    Schema-driven flatten for one Whoop category:
+    1. Drops out-of-window records on the raw ISO date string (before any normalizing)
+    2. Builds each schema column with one list comprehension (no json_normalize / renaming)
+    3. Parses the date column as ISO 8601
+    Accepts raw records or a flat lake DataFrame ('score_strain' style columns).
     """
-    if not data_list or not isinstance(data_list, list):
-        return pd.DataFrame()
+    schema = WHOOP_SCHEMAS.get(category)
+    if schema is None:
+        return flatten_and_filter(data, start_date, end_date)
+    date_col, columns = schema['date'], schema['columns']
+    lo, hi = window_days(start_date, end_date)
 
-    df = pd.json_normalize(data_list, sep='_')
-    df.columns = [c.replace('score_', '').replace('stage_summary_', '').lower() for c in df.columns]
+    if isinstance(data, pd.DataFrame):
+        flat_names = {'_'.join(path): col for col, path in columns.items()}
+        df = data.rename(columns=flat_names)
+        df = df[[c for c in columns if c in df.columns]]
+        if df.empty or date_col not in df.columns: return pd.DataFrame()
+        days = pd.to_datetime(df[date_col], errors='coerce').dt.strftime('%Y-%m-%d')
+        df = df.loc[(days >= lo) & (days <= hi)].copy()
+    else:
+        if not data or not isinstance(data, list): return pd.DataFrame()
+        date_path = columns[date_col]
+        kept = []
+        for r in data:
+            day = dig(r, date_path)
+            if isinstance(day, str) and lo <= day[:10] <= hi:
+                kept.append(r)
+        if not kept: return pd.DataFrame()
+        df = pd.DataFrame({col: [dig(r, path) for r in kept] for col, path in columns.items()})
 
-    date_col = None
-    candidates = ['start', 'created_at', 'date', 'entrydate', 'cycle']
-    for c in df.columns:
-        if any(name in c for name in candidates):
-            date_col = c
-            if 'start' in c or 'date' in c: break
-    
+    df[date_col] = parse_dates(df[date_col])
+    df['day_str'] = df[date_col].dt.strftime('%Y-%m-%d')
+    return df.sort_values(by=date_col)
+
+def find_date_key(keys):
+    for k in keys:
+        if k.lower() in ('date', 'entrydate'): return k
+    for k in keys:
+        if 'date' in k.lower() and k.lower() != 'updated_at': return k
+    return None
+
+def flatten_and_filter(data, start_date, end_date):
+    """
+    Generic flatten for sheet-style sources (nutrition, vitals):
+    1. Drops out-of-window records by their date before json_normalize
+    2. Parses the date column with known formats
+    """
+    if isinstance(data, pd.DataFrame):
+        if data.empty: return pd.DataFrame()
+        df = data.copy()
+        df.columns = [c.lower() for c in df.columns]
+    else:
+        if not data or not isinstance(data, list):
+            return pd.DataFrame()
+        lo, hi = window_days(start_date, end_date)
+        kept = []
+        for r in data:
+            day = biostack_storage.record_day(r)
+            if day is None or lo <= day <= hi:
+                kept.append(r)
+        if not kept: return pd.DataFrame()
+        df = pd.json_normalize(kept, sep='_')
+        df.columns = [c.lower() for c in df.columns]
+
+    date_col = find_date_key(df.columns)
     if not date_col:
         return df
 
-    try:
-        df[date_col] = pd.to_datetime(df[date_col], errors='coerce').dt.tz_localize(None)
-        df['day_str'] = df[date_col].dt.strftime('%Y-%m-%d')
-        
-        start = pd.to_datetime(start_date).replace(tzinfo=None)
-        end = pd.to_datetime(end_date).replace(tzinfo=None) + timedelta(days=1)
-        
-        mask = (df[date_col] >= start) & (df[date_col] < end)
-        df_filtered = df.loc[mask].copy()
-        return df_filtered.sort_values(by=date_col)
-    except:
-        return df
+    df[date_col] = parse_dates(df[date_col])
+    df = df.dropna(subset=[date_col])
+    df['day_str'] = df[date_col].dt.strftime('%Y-%m-%d')
+    lo, hi = window_days(start_date, end_date)
+    df = df.loc[(df['day_str'] >= lo) & (df['day_str'] <= hi)].copy()
+    return df.sort_values(by=date_col)
 
 def aggregate_nutrition_dailies(df):
     """ Calculates Daily Macro Totals """
@@ -115,11 +412,396 @@ def clean_whoop_cycles(df):
 
     return clean_df
 
+def build_whoop_daily(frames):
+    """
+    Joins the flattened Whoop categories into ONE row per physiological day (cycle):
+      cycles.id <- recovery.cycle_id            (hash join on the cycle index)
+      recovery.sleep_id -> sleep.id              (falls back to sleep.cycle_id, naps excluded)
+      workouts -> the cycle they started in      (as-of join on start time, aggregated)
+    """
+    cycles = frames.get('cycles', pd.DataFrame())
+    if cycles.empty or 'id' not in cycles.columns:
+        return pd.DataFrame()
+
+    daily = cycles.drop_duplicates('id').set_index('id')[
+        [c for c in ['start', 'day_str', 'strain', 'kilojoule', 'average_heart_rate', 'max_heart_rate'] if c in cycles.columns]
+    ]
+
+    recovery = frames.get('recovery', pd.DataFrame())
+    if not recovery.empty and 'cycle_id' in recovery.columns:
+        rec_cols = [c for c in ['sleep_id', 'recovery_score', 'hrv_rmssd_milli', 'resting_heart_rate',
+                                'spo2_percentage', 'skin_temp_celsius'] if c in recovery.columns]
+        daily = daily.join(recovery.drop_duplicates('cycle_id', keep='last').set_index('cycle_id')[rec_cols])
+
+    sleep = frames.get('sleep', pd.DataFrame())
+    if not sleep.empty and 'id' in sleep.columns:
+        if 'nap' in sleep.columns:
+            sleep = sleep[sleep['nap'] != True]
+        sleep_cols = [c for c in ['total_in_bed_time_milli', 'sleep_performance_percentage',
+                                  'sleep_efficiency_percentage', 'respiratory_rate'] if c in sleep.columns]
+        by_sleep_id = sleep.drop_duplicates('id', keep='last').set_index('id')[sleep_cols]
+        if 'sleep_id' in daily.columns:
+            daily = daily.join(by_sleep_id, on='sleep_id')
+        else:
+            daily = daily.join(by_sleep_id.iloc[0:0])
+        if 'cycle_id' in sleep.columns:
+            by_cycle = sleep.drop_duplicates('cycle_id', keep='last').set_index('cycle_id')[sleep_cols]
+            daily = daily.fillna(by_cycle.reindex(daily.index))
+        if 'total_in_bed_time_milli' in daily.columns:
+            daily['hours_sleep'] = round(daily['total_in_bed_time_milli'] / (1000 * 60 * 60), 2)
+            daily = daily.drop(columns=['total_in_bed_time_milli'])
+
+    workouts = frames.get('workouts', pd.DataFrame())
+    if not workouts.empty and 'start' in workouts.columns and 'start' in daily.columns:
+        spans = daily[['start']].reset_index().rename(columns={'index': 'cycle_id', 'id': 'cycle_id'})
+        spans = spans.sort_values('start')
+        w = pd.merge_asof(workouts.sort_values('start'), spans, on='start', direction='backward')
+        agg = {'workouts': ('start', 'count')}
+        if 'strain' in w.columns: agg['workout_strain'] = ('strain', 'sum')
+        if 'kilojoule' in w.columns: agg['workout_kilojoule'] = ('kilojoule', 'sum')
+        if 'sport_name' in w.columns: agg['sports'] = ('sport_name', lambda x: ','.join(sorted(set(x.dropna()))))
+        daily = daily.join(w.dropna(subset=['cycle_id']).groupby('cycle_id').agg(**agg))
+        daily['workouts'] = daily['workouts'].fillna(0).astype(int)
+
+    daily = daily.drop(columns=[c for c in ['start', 'sleep_id'] if c in daily.columns])
+    return daily.sort_values('day_str').reset_index(drop=True)
+
 def to_minified_json(df):
     if df.empty: return "[]"
     df = df.round(2)
     return df.to_json(orient='records')
 
+def decimals_for(col):
+    if col in ROUNDING: return ROUNDING[col]
+    for pattern, decimals in ROUNDING_RULES:
+        if pattern in col: return decimals
+    return DEFAULT_DECIMALS
+
+def compact_frame(df):
+    """ Per-column rounding; drops raw datetime columns that day_str already carries """
+    df = df.copy()
+    if 'day_str' in df.columns:
+        df = df.drop(columns=[c for c in df.columns if pd.api.types.is_datetime64_any_dtype(df[c])])
+    for col in df.columns:
+        if not pd.api.types.is_numeric_dtype(df[col]) or pd.api.types.is_bool_dtype(df[col]): continue
+        decimals = decimals_for(col)
+        df[col] = df[col].round(decimals)
+        if decimals == 0:
+            df[col] = df[col].astype('Int64')
+    return df
+
+def encode_columnar(df):
+    return compact_frame(df).to_json(orient='split', index=False)
+
+def encode_csv(df):
+    return compact_frame(df).to_csv(index=False, lineterminator='\n').rstrip('\n')
+
+def encode_delta(df):
+    df = compact_frame(df)
+    if 'day_str' not in df.columns:
+        return df.to_json(orient='split', index=False)
+    days = pd.to_datetime(df['day_str'], format='%Y-%m-%d')
+    base = df['day_str'].iloc[0]
+    df = df.drop(columns=['day_str'])
+    df.insert(0, '+day', days.diff().dt.days.fillna(0).astype(int).values)
+    body = df.to_json(orient='split', index=False)
+    return '{"base":' + json.dumps(base) + ',' + body[1:]
+
+ENCODERS = {
+    'records': to_minified_json,
+    'columnar': encode_columnar,
+    'csv': encode_csv,
+    'delta': encode_delta
+}
+
+def estimate_tokens(text):
+    """ BPE-ish estimate: words, 1-3 digit number chunks and each punctuation mark count as one token """
+    return len(TOKEN_PATTERN.findall(text))
+
+def render_block(name, df, encoding='records'):
+    body = ENCODERS[encoding](df) if not df.empty else "[]"
+    fmt = "" if encoding == 'records' else f" format='{encoding}'"
+    return f"<data name='{name}'{fmt}>\n{body}\n</data>"
+
+def report_encodings(blocks, chosen, render=render_block):
+    """ Bytes / estimated tokens per block for every encoding; * marks the one used """
+    print("📏 Block size by encoding (bytes / ~tokens):")
+    print(f"   {'block':<26}" + "".join(f"{enc:>20}" for enc in ENCODINGS))
+    totals = {enc: [0, 0] for enc in ENCODINGS}
+    for name, df in blocks:
+        cells = []
+        for enc in ENCODINGS:
+            text = render(name, df, enc)
+            size, tokens = len(text.encode('utf-8')), estimate_tokens(text)
+            totals[enc][0] += size
+            totals[enc][1] += tokens
+            mark = '*' if chosen[name] == enc else ' '
+            cells.append(f"{size:>9,} / {tokens:>7,}{mark}")
+        print(f"   {name:<26}" + "".join(f"{c:>20}" for c in cells))
+    print(f"   {'TOTAL':<26}" + "".join(f"{f'{b:,} / {t:,}':>19} " for b, t in totals.values()))
+
+def parse_block_encodings(default, overrides):
+    chosen = {}
+    for item in overrides:
+        name, _, enc = item.partition('=')
+        if enc not in ENCODINGS:
+            raise SystemExit(f"❌ Unknown encoding '{enc}' for block '{name}'. Choose from {ENCODINGS}")
+        chosen[name.strip()] = enc
+    return lambda name: chosen.get(name, default)
+
+def keep_newest(df, fraction):
+    """ Keeps the most recent share of rows (blocks are day-ordered) """
+    if 'day_str' in df.columns:
+        df = df.sort_values('day_str', kind='stable')
+    return df.tail(max(1, int(len(df) * fraction)))
+
+def top_foods(df, n):
+    """ Collapses the raw food log to the n items contributing the most calories """
+    if 'name' not in df.columns:
+        return keep_newest(df, 0.5)
+    sums = [c for c in ['calories', 'protein', 'fat', 'carbs'] if c in df.columns]
+    numeric = df[sums].apply(pd.to_numeric, errors='coerce')
+    grouped = numeric.groupby(df['name']).sum()
+    grouped.insert(0, 'times_logged', df.groupby('name').size())
+    sort_col = 'calories' if 'calories' in grouped.columns else 'times_logged'
+    return grouped.sort_values(sort_col, ascending=False).head(n).reset_index()
+
+def apply_reduction(df, action, arg):
+    if action == 'drop': return df.iloc[0:0]
+    if action == 'newest': return keep_newest(df, arg)
+    if action == 'top_foods': return top_foods(df, arg)
+    raise ValueError(f"Unknown reduction: {action}")
+
+def plan_budget(blocks, budget, encoding_for, overhead=0, render=render_block):
+    """
+    Fits the blocks into ~budget tokens (template overhead included) by walking TRIM_PLAN.
+    Returns the (possibly reduced) blocks; empty blocks are dropped.
+    """
+    blocks = list(blocks)
+    original = [df for _, df in blocks]
+    cost = [estimate_tokens(render(name, df, encoding_for(name))) for name, df in blocks]
+    total = overhead + sum(cost)
+    print(f"🎯 Token budget: {budget:,} | estimated brief: {total:,}")
+    if total <= budget:
+        return blocks
+
+    for target, steps in TRIM_PLAN:
+        for label, action, arg in steps:
+            if total <= budget: break
+            for i, (name, df) in enumerate(blocks):
+                if name != target and not (target.endswith('_') and name.startswith(target)): continue
+                if df.empty: continue
+                df = apply_reduction(original[i], action, arg)
+                new_cost = estimate_tokens(render(name, df, encoding_for(name))) if not df.empty else 0
+                print(f"   ✂️ {name}: {label} ({cost[i]:,} -> {new_cost:,} tokens)")
+                total += new_cost - cost[i]
+                blocks[i], cost[i] = (name, df), new_cost
+
+    if total > budget:
+        print(f"⚠️ Brief still ~{total:,} tokens after all reductions (budget {budget:,})")
+    else:
+        print(f"   ✅ Fitted: ~{total:,} tokens")
+    return [(name, df) for name, df in blocks if not df.empty]
+
+def write_brief(filename, template_content, rendered_blocks):
+    """ Streams template + blocks to disk one block at a time """
+    # Safe Replacement (split, not f-string, to avoid curly brace errors in templates)
+    if "{{DATASET}}" in template_content:
+        head, _, tail = template_content.partition("{{DATASET}}")
+    else:
+        # Fallback if user forgot the tag
+        head, tail = template_content + "\n\n", ""
+
+    with open(filename, "w", encoding='utf-8') as f:
+        f.write(head)
+        for i, block in enumerate(rendered_blocks):
+            if i: f.write("\n")
+            f.write(block)
+        f.write(tail)
+
+def social_frame(raw_social):
+    """ {handle: [{ts, content}, ...]} -> one row per tweet """
+    rows = []
+    for handle, tweets in (raw_social or {}).items():
+        for t in tweets or []:
+            ts = str(t.get('ts', ''))
+            rows.append({'day_str': ts[:10], 'handle': handle, 'content': t.get('content', '')})
+    df = pd.DataFrame(rows)
+    return df.sort_values('day_str') if not df.empty else df
+
+def nutrition_blocks(raw_nutrition, start_date, end_date):
+    if not has_data(raw_nutrition): return []
+    flat_nut = flatten_and_filter(raw_nutrition, start_date, end_date)
+    daily_macros, event_log = aggregate_nutrition_dailies(flat_nut)
+    blocks = []
+    if not daily_macros.empty:
+        blocks.append(('nutrition_daily_totals', daily_macros))
+    if not event_log.empty:
+        blocks.append(('nutrition_raw_log', event_log))
+    return blocks
+
+def whoop_blocks(raw_whoop, start_date, end_date):
+    if not (has_data(raw_whoop) and isinstance(raw_whoop, dict)): return []
+    # Sleep/recovery were loaded from the day before (LOAD_LEAD_DAYS): keep that extra day for them only
+    frames = {}
+    for category, records in raw_whoop.items():
+        lo = load_start(f"whoop_{category}", start_date)
+        frames[category] = flatten_whoop(category, records, lo, end_date)
+    whoop_daily = build_whoop_daily(frames)
+    if not whoop_daily.empty:
+        return [('whoop_daily', whoop_daily)]
+    # No cycles to anchor the join: fall back to per-category blocks
+    blocks = []
+    for category, df_flat in frames.items():
+        if category in ['recovery', 'cycles', 'sleep']:
+            df_flat = clean_whoop_cycles(df_flat)
+        blocks.append((f"whoop_{category}", df_flat))
+    return blocks
+
+def correlation_blocks(blocks):
+    """ Nutrition -> Whoop correlations (lag 0-3 days) from the already-built blocks """
+    frames = dict(blocks)
+    if 'nutrition_daily_totals' not in frames or 'whoop_daily' not in frames: return []
+    correlations = biostack_correlate.correlation_frame(frames['nutrition_daily_totals'], frames['whoop_daily'])
+    return [('correlations', correlations)] if not correlations.empty else []
+
+def vitals_blocks(raw_vitals, start_date, end_date):
+    if not has_data(raw_vitals): return []
+    return [('vitals', flatten_and_filter(raw_vitals, start_date, end_date))]
+
+def social_blocks(raw_social, start_date, end_date):
+    # We don't need much filtering here as the fetcher already did it
+    if not raw_social: return []
+    return [('social_expert_feed', social_frame(raw_social))]
+
+# Prompt order; correlations are derived from nutrition + whoop and slot in after them
+SOURCE_BUILDERS = {
+    'nutrition': nutrition_blocks,
+    'whoop': whoop_blocks,
+    'vitals': vitals_blocks,
+    'social': social_blocks
+}
+
+def assemble_blocks(per_source, correlations):
+    return per_source['nutrition'] + per_source['whoop'] + correlations + per_source['vitals'] + per_source['social']
+
+def build_blocks(loaded, start_date, end_date):
+    """ All <data> blocks as (name, DataFrame), in prompt order """
+    per_source = {src: build(loaded.get(src), start_date, end_date) for src, build in SOURCE_BUILDERS.items()}
+    return assemble_blocks(per_source, correlation_blocks(per_source['nutrition'] + per_source['whoop']))
+
+# --- FRAGMENT MEMOIZATION ---
+
+def source_version(s3, source, start_date, end_date, topics=None):
+    """ What the window would be built from: manifest entries, else the newest object. None = unknown. """
+    try:
+        if source == 'social':
+            etag = biostack_tweets.index_etag(s3, BUCKET_NAME)
+            if etag:
+                return [(biostack_tweets.INDEX_KEY, etag, sorted(topics or biostack_tweets.TOPICS))]
+        versions = biostack_storage.range_versions(s3, BUCKET_NAME, source, load_start(source, start_date), end_date)
+        if versions is not None:
+            return versions
+        latest = newest_object(s3, source)
+        return [(latest['Key'], latest['ETag'].strip('"'))] if latest else []
+    except Exception as e:
+        print(f"⚠️  Could not version {source}: {e}")
+        return None
+
+def fragment_key(*parts):
+    return hashlib.sha256(json.dumps([TRANSFORM_VERSION, *parts], default=str).encode('utf-8')).hexdigest()[:32]
+
+def fragment_path(name):
+    return os.path.join(FRAGMENT_DIR, name)
+
+def load_fragment(key):
+    path = fragment_path(f"{key}.pkl")
+    if key is None or not os.path.exists(path): return None
+    try:
+        blocks = pd.read_pickle(path)
+        os.utime(path)
+        return blocks
+    except Exception:
+        return None
+
+def save_fragment(key, blocks):
+    if key is None: return
+    os.makedirs(FRAGMENT_DIR, exist_ok=True)
+    tmp = fragment_path(f"{key}.pkl.tmp")
+    pd.to_pickle(blocks, tmp)
+    os.replace(tmp, fragment_path(f"{key}.pkl"))
+
+def prune_fragments():
+    """ Drops fragments nobody has read for FRAGMENT_TTL_DAYS """
+    if not os.path.isdir(FRAGMENT_DIR): return
+    cutoff = time.time() - FRAGMENT_TTL_DAYS * 86400
+    for name in os.listdir(FRAGMENT_DIR):
+        path = fragment_path(name)
+        if os.path.getmtime(path) < cutoff:
+            os.remove(path)
+
+def build_blocks_memoized(s3, start_date, end_date, topics=None):
+    """
+    Like load_from_s3 + build_blocks, but each source's blocks are cached under
+    (source object ETags, date range, TRANSFORM_VERSION). Unchanged sources are
+    neither downloaded nor re-flattened. Returns (blocks, {block name: fragment key}).
+    """
+    days = window_days(start_date, end_date)
+    with ThreadPoolExecutor(max_workers=len(SOURCES)) as pool:
+        versions = dict(zip(SOURCES, pool.map(
+            lambda src: source_version(s3, src, start_date, end_date, topics), SOURCES)))
+    keys = {src: fragment_key(src, versions[src], days) if versions[src] is not None else None for src in SOURCES}
+
+    per_source = {src: load_fragment(keys[src]) for src in SOURCES}
+    missing = [src for src in SOURCES if per_source[src] is None]
+    reused = [src for src in SOURCES if per_source[src] is not None]
+    if reused:
+        print(f"♻️  Reusing cached fragments: {', '.join(reused)}")
+
+    if missing:
+        loaded = load_from_s3(s3, start_date, end_date, sources=missing, topics=topics)
+        for src in missing:
+            per_source[src] = SOURCE_BUILDERS[src](loaded[src], start_date, end_date)
+            save_fragment(keys[src], per_source[src])
+
+    corr_key = fragment_key('correlations', keys['nutrition'], keys['whoop']) \
+        if keys['nutrition'] and keys['whoop'] else None
+    correlations = load_fragment(corr_key)
+    if correlations is None:
+        correlations = correlation_blocks(per_source['nutrition'] + per_source['whoop'])
+        save_fragment(corr_key, correlations)
+
+    block_keys = {}
+    for src in SOURCES:
+        for name, _ in per_source[src]:
+            block_keys[name] = keys[src]
+    for name, _ in correlations:
+        block_keys[name] = corr_key
+    prune_fragments()
+    return assemble_blocks(per_source, correlations), block_keys
+
+def fragment_renderer(blocks, block_keys):
+    """
+    render_block with the serialized text memoized per (fragment, block, encoding).
+    Only blocks still identical to the built ones are memoized (budget-trimmed copies are not).
+    """
+    originals = {name: df for name, df in blocks}
+
+    def render(name, df, encoding='records'):
+        key = block_keys.get(name)
+        if key is None or originals.get(name) is not df:
+            return render_block(name, df, encoding)
+        path = fragment_path(f"{key}-{name}-{encoding}.txt")
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                return f.read()
+        text = render_block(name, df, encoding)
+        os.makedirs(FRAGMENT_DIR, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return text
+    return render
+
 def load_template_string(path):
     """ Safe Loader for Template """
     if os.path.exists(path):
@@ -131,6 +813,47 @@ def load_template_string(path):
         print("   -> Fallback: Using default internal minimal prompt.")
         return """DATA ANALYSIS REQUEST:\n\n{{DATASET}}"""
 
+def parse_jobs(specs, default_template):
+    """ ['7', '30:templates/x.txt'] -> [(days, template), ...] """
+    jobs = []
+    for spec in specs:
+        days, _, template = spec.partition(':')
+        if not days.strip().isdigit():
+            raise SystemExit(f"❌ Bad --job '{spec}': expected DAYS or DAYS:TEMPLATE")
+        jobs.append((int(days), template or default_template))
+    return jobs
+
+def job_filename(start_date, end_date, template_path):
+    stem = os.path.splitext(os.path.basename(template_path))[0]
+    return f"biostack_prompt_{start_date:%Y-%m-%d}_to_{end_date:%Y-%m-%d}_{stem}.txt"
+
+def clear_outputs():
+    """ Removes briefs from earlier runs so the Drive courier only uploads this run's output """
+    for path in glob.glob(OUTPUT_GLOB):
+        os.remove(path)
+
+def slice_blocks(blocks, start_date, end_date):
+    """ Narrows day-level blocks to [start, end]; unchanged frames are returned as-is (keeps memoized renders) """
+    lo, hi = window_days(start_date, end_date)
+    sliced = []
+    for name, df in blocks:
+        if 'day_str' in df.columns:
+            inside = (df['day_str'] >= lo) & (df['day_str'] <= hi)
+            if not inside.all():
+                df = df.loc[inside]
+        if not df.empty:
+            sliced.append((name, df))
+    return sliced
+
+def write_job(blocks, render, chosen, template_path, filename, token_budget=None):
+    report_encodings(blocks, chosen, render)
+    template_content = load_template_string(template_path)
+    if token_budget:
+        overhead = estimate_tokens(template_content.replace("{{DATASET}}", ""))
+        blocks = plan_budget(blocks, token_budget, lambda name: chosen[name], overhead, render)
+    write_brief(filename, template_content, (render(name, df, chosen[name]) for name, df in blocks))
+    print(f"\n✅ OPTIMIZED PROMPT SAVED: {filename}")
+
 def main():
     args = get_args()
     
@@ -142,60 +865,58 @@ def main():
         start_date = datetime.strptime(args.start, '%Y-%m-%d')
     else:
         start_date = end_date - timedelta(days=args.days)
+
+    # Batch mode: everything is loaded once for the widest job and sliced per job
+    jobs = parse_jobs(args.job, args.template)
+    if jobs:
+        start_date = end_date - timedelta(days=max(days for days, _ in jobs))
         
     print(f"🧠 Biostack Analyst: {start_date.date()} -> {end_date.date()}")
     
+    if args.no_cache:
+        biostack_storage.disable_cache()
     s3 = get_s3_client()
-    raw_whoop = get_latest_file_content(s3, 'whoop')
-    raw_nutrition = get_latest_file_content(s3, 'nutrition')
-    raw_vitals = get_latest_file_content(s3, 'vitals')
-
-    prompt_data = []
-
-    # --- 1. NUTRITION ---
-    if raw_nutrition:
-        flat_nut = flatten_and_filter(raw_nutrition, start_date, end_date)
-        daily_macros, event_log = aggregate_nutrition_dailies(flat_nut)
-        if not daily_macros.empty:
-            prompt_data.append(f"<data name='nutrition_daily_totals'>\n{to_minified_json(daily_macros)}\n</data>")
-        if not event_log.empty:
-            prompt_data.append(f"<data name='nutrition_raw_log'>\n{to_minified_json(event_log)}\n</data>")
-
-    # --- 2. WHOOP ---
-    if raw_whoop and isinstance(raw_whoop, dict):
-        for category, records in raw_whoop.items():
-            df_flat = flatten_and_filter(records, start_date, end_date)
-            if category in ['recovery', 'cycles', 'sleep']:
-                df_flat = clean_whoop_cycles(df_flat)
-            prompt_data.append(f"<data name='whoop_{category}'>\n{to_minified_json(df_flat)}\n</data>")
-            
-    # --- 3. VITALS ---
-    if raw_vitals:
-        df_vitals = flatten_and_filter(raw_vitals, start_date, end_date)
-        prompt_data.append(f"<data name='vitals'>\n{to_minified_json(df_vitals)}\n</data>")
-
-    # --- 4. SOCIAL TWEETS ---
-    raw_social = get_latest_file_content(s3, 'social')
-    if raw_social:
-        # We don't need much filtering here as the fetcher already did it
-        prompt_data.append(f"<data name='social_expert_feed'>\n{json.dumps(raw_social)}\n</data>")
+    topics = [t.strip() for t in args.topics.split(',') if t.strip()] if args.topics else None
+    block_keys = {}
+    if args.lake or args.no_memo:
+        # Lake partitions are not versioned per window: always rebuild
+        if args.lake:
+            loaded = load_from_lake(s3, start_date, end_date, topics=topics)
+        else:
+            loaded = load_from_s3(s3, start_date, end_date, topics=topics)
+        blocks = build_blocks(loaded, start_date, end_date)
+    else:
+        blocks, block_keys = build_blocks_memoized(s3, start_date, end_date, topics=topics)
+    if not args.no_baselines:
+        try:
+            rollups = biostack_rollup.update(s3, BUCKET_NAME, biostack_rollup.daily_series(blocks))
+            baselines = biostack_rollup.baseline_frame(rollups, end_date)
+            if not baselines.empty:
+                blocks.insert(0, ('baselines', baselines))
+        except Exception as e:
+            print(f"⚠️  Rollup update failed: {e}")
+    encoding_for = parse_block_encodings(args.encoding, args.block_encoding)
+    render = fragment_renderer(blocks, block_keys)
+    clear_outputs()
 
     # --- 5. CONSTRUCT PROMPT FROM TEMPLATE ---
-    data_block = "\n".join(prompt_data)
-    template_content = load_template_string(args.template)
-    
-    # Safe Replacement (Use .replace, not f-string, to avoid curly brace errors in templates)
-    if "{{DATASET}}" in template_content:
-        final_prompt = template_content.replace("{{DATASET}}", data_block)
-    else:
-        # Fallback if user forgot the tag
-        final_prompt = template_content + "\n\n" + data_block
+    if not jobs:
+        chosen = {name: encoding_for(name) for name, _ in blocks}
+        write_job(blocks, render, chosen, args.template, OUTPUT_FILE, args.token_budget)
+        return
 
-    filename = "biostack_prompt.txt"
-    with open(filename, "w", encoding='utf-8') as f:
-        f.write(final_prompt)
-    
-    print(f"\n✅ OPTIMIZED PROMPT SAVED: {filename}")
+    for days, template_path in jobs:
+        job_start = end_date - timedelta(days=days)
+        print(f"\n📝 Job: {days} days ({job_start.date()} -> {end_date.date()}) with {template_path}")
+        job_blocks = slice_blocks(blocks, job_start, end_date)
+        # Correlations are window statistics: recompute them for narrower windows
+        if job_start > start_date:
+            narrowed = dict(correlation_blocks(job_blocks))
+            job_blocks = [(n, narrowed[n]) if n in narrowed else (n, df) for n, df in job_blocks
+                          if n != 'correlations' or n in narrowed]
+        chosen = {name: encoding_for(name) for name, _ in job_blocks}
+        write_job(job_blocks, render, chosen, template_path, job_filename(job_start, end_date, template_path),
+                  args.token_budget)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
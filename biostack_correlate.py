@@ -0,0 +1,98 @@
+import math
+import numpy as np
+import pandas as pd
+
+# --- CONFIG ---
+MAX_LAG = 3          # nutrition on day t vs. Whoop on day t + lag
+MIN_PAIRS = 10       # fewer overlapping days than this -> no estimate
+MAX_Q = 0.10         # Benjamini-Hochberg cut-off for the brief
+TOP_N = 15
+
+erfc = np.vectorize(math.erfc, otypes=[float])
+
+def daily_matrix(df, exclude=('day_str',)):
+    """ day_str-indexed numeric frame (one row per calendar day, gaps as NaN) """
+    if df is None or df.empty or 'day_str' not in df.columns:
+        return pd.DataFrame()
+    cols = [c for c in df.columns if c not in exclude and pd.api.types.is_numeric_dtype(df[c])
+            and not pd.api.types.is_bool_dtype(df[c])]
+    daily = df.groupby('day_str')[cols].mean()
+    daily.index = pd.to_datetime(daily.index)
+    return daily
+
+def lagged_stack(x, y, max_lag):
+    """
+    x: (T, p), y: (T, q) on the same day index -> (L, T, p), (L, T, q) where
+    slice l pairs x[t] with y[t + l]; the tail that runs past the end is NaN
+    (lags of T days or more stay all-NaN).
+    """
+    T = x.shape[0]
+    xs = np.full((max_lag + 1, T, x.shape[1]), np.nan)
+    ys = np.full((max_lag + 1, T, y.shape[1]), np.nan)
+    for lag in range(min(max_lag, T - 1) + 1):
+        xs[lag, :T - lag] = x[:T - lag]
+        ys[lag, :T - lag] = y[lag:]
+    return xs, ys
+
+def lagged_correlations(x, y, max_lag=MAX_LAG):
+    """
+    Pairwise-complete Pearson r for every (x col, y col, lag) in one batched pass.
+    Returns r, n, p arrays of shape (L, p, q); p from the Fisher z transform.
+    """
+    xs, ys = lagged_stack(x, y, max_lag)
+    mx, my = ~np.isnan(xs), ~np.isnan(ys)
+    fx, fy = mx.astype(float), my.astype(float)
+    x0, y0 = np.where(mx, xs, 0.0), np.where(my, ys, 0.0)
+
+    # Sums restricted to days where BOTH series are present
+    n = np.einsum('ltp,ltq->lpq', fx, fy)
+    sx = np.einsum('ltp,ltq->lpq', x0, fy)
+    sy = np.einsum('ltp,ltq->lpq', fx, y0)
+    sxx = np.einsum('ltp,ltq->lpq', x0 * x0, fy)
+    syy = np.einsum('ltp,ltq->lpq', fx, y0 * y0)
+    sxy = np.einsum('ltp,ltq->lpq', x0, y0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = n * sxy - sx * sy
+        var = (n * sxx - sx * sx) * (n * syy - sy * sy)
+        r = np.where((n >= MIN_PAIRS) & (var > 0), cov / np.sqrt(var), np.nan)
+        r = np.clip(r, -0.999999, 0.999999)
+        z = np.arctanh(r) * np.sqrt(np.maximum(n - 3, 0))
+    p = erfc(np.abs(np.nan_to_num(z)) / math.sqrt(2))
+    p[np.isnan(r)] = np.nan
+    return r, n.astype(int), p
+
+def bh_qvalues(p):
+    """ Benjamini-Hochberg adjusted p-values for a flat array (NaNs ignored) """
+    q = np.full(p.shape, np.nan)
+    valid = np.flatnonzero(~np.isnan(p))
+    if valid.size == 0: return q
+    order = valid[np.argsort(p[valid])]
+    ranked = p[order] * valid.size / np.arange(1, valid.size + 1)
+    q[order] = np.minimum(np.minimum.accumulate(ranked[::-1])[::-1], 1.0)
+    return q
+
+def correlation_frame(nutrition_daily, whoop_daily, max_lag=MAX_LAG, top_n=TOP_N, max_q=MAX_Q):
+    """ Strongest nutrition -> Whoop associations (lag 0..max_lag days) that survive FDR control """
+    x_df, y_df = daily_matrix(nutrition_daily), daily_matrix(whoop_daily)
+    if x_df.empty or y_df.empty:
+        return pd.DataFrame()
+
+    days = pd.date_range(min(x_df.index.min(), y_df.index.min()), max(x_df.index.max(), y_df.index.max()))
+    x = x_df.reindex(days).to_numpy(dtype=float)
+    y = y_df.reindex(days).to_numpy(dtype=float)
+    r, n, p = lagged_correlations(x, y, max_lag)
+    q = bh_qvalues(p.ravel()).reshape(p.shape)
+
+    lag, i, j = np.nonzero(q <= max_q)
+    if lag.size == 0:
+        return pd.DataFrame()
+    out = pd.DataFrame({
+        'nutrition': x_df.columns[i], 'whoop': y_df.columns[j], 'lag_days': lag,
+        'r': r[lag, i, j].round(2), 'n': n[lag, i, j], 'p': p[lag, i, j], 'q': q[lag, i, j]
+    })
+    out = out.reindex(out['r'].abs().sort_values(ascending=False).index).head(top_n).reset_index(drop=True)
+    # Preformatted: the block renderers round numeric columns to 2 decimals, which would turn every p/q into 0.0
+    out['p'] = out['p'].map(lambda v: f"{v:.2g}")
+    out['q'] = out['q'].map(lambda v: f"{v:.2g}")
+    return out
@@ -1,4 +1,5 @@
 import os
+import glob
 import argparse
 import datetime
 from googleapiclient.discovery import build
@@ -16,6 +17,8 @@ CREDENTIALS_FILE = 'credentials.json'
 TOKEN_FILE = 'drive_token.json'
 SCOPES = ['https://www.googleapis.com/auth/drive.file']
 FILENAME_LOCAL = 'biostack_prompt.txt'
+# Batch runs of the Analyst write biostack_prompt_<start>_to_<end>_<template>.txt
+BATCH_GLOB = 'biostack_prompt_*.txt'
 
 def get_args():
     parser = argparse.ArgumentParser()
@@ -55,21 +58,22 @@ def authenticate():
             token.write(creds.to_json())
     return creds
 
-def upload_file(start_date, end_date):
-    if not os.path.exists(FILENAME_LOCAL):
-        print(f"❌ Error: {FILENAME_LOCAL} missing. Run analyst script first.")
-        return
-
-    # 1. Generate Dynamic Filename
-    # Format: BioStack_Brief_2025-01-01_to_2025-01-08.txt
-    start_str = start_date.strftime('%Y-%m-%d')
-    end_str = end_date.strftime('%Y-%m-%d')
-    target_filename = f"BioStack_Brief_{start_str}_to_{end_str}.txt"
+def target_name(local_path, start_date, end_date):
+    """ biostack_prompt.txt -> BioStack_Brief_<start>_to_<end>.txt; batch files keep their own suffix """
+    base = os.path.basename(local_path)
+    if base == FILENAME_LOCAL:
+        # Format: BioStack_Brief_2025-01-01_to_2025-01-08.txt
+        return f"BioStack_Brief_{start_date.strftime('%Y-%m-%d')}_to_{end_date.strftime('%Y-%m-%d')}.txt"
+    return "BioStack_Brief_" + base[len('biostack_prompt_'):]
 
-    creds = authenticate()
-    service = build('drive', 'v3', credentials=creds)
+def local_outputs():
+    paths = sorted(glob.glob(BATCH_GLOB))
+    if os.path.exists(FILENAME_LOCAL):
+        paths.insert(0, FILENAME_LOCAL)
+    return paths
 
-    # 2. Check if THIS specific week already exists (to prevent duplicates if run twice)
+def upload_file(service, local_path, target_filename):
+    # Check if THIS specific week already exists (to prevent duplicates if run twice)
     # query looks for exact name inside specific folder
     query = f"name = '{target_filename}' and '{FOLDER_ID}' in parents and trashed = false"
     results = service.files().list(q=query, fields="files(id)").execute()
@@ -79,7 +83,7 @@ def upload_file(start_date, end_date):
         'name': target_filename,
         'parents': [FOLDER_ID]
     }
-    media = MediaFileUpload(FILENAME_LOCAL, mimetype='text/plain')
+    media = MediaFileUpload(local_path, mimetype='text/plain')
 
     if files:
         # Update existing
@@ -107,8 +111,16 @@ def main():
 
     args = get_args()
     start, end = calculate_dates(args)
-    
-    upload_file(start, end)
+
+    paths = local_outputs()
+    if not paths:
+        print(f"❌ Error: {FILENAME_LOCAL} missing. Run analyst script first.")
+        return
+
+    creds = authenticate()
+    service = build('drive', 'v3', credentials=creds)
+    for path in paths:
+        upload_file(service, path, target_name(path, start, end))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
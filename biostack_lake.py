@@ -0,0 +1,207 @@
+import io
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from datetime import timedelta
+
+import biostack_storage
+
+# --- CONFIG ---
+# Layout: lake/<source>/year=YYYY/month=MM/data.parquet
+LAKE_PREFIX = 'lake'
+COMPRESSION = 'zstd'
+
+# Per-source schema.
+#   date_col: column used for partitioning + range pruning (None = auto-detect a 'date' column)
+#   key:      upsert identity; without one, a new batch replaces existing rows inside its date window
+#   columns:  typed columns; anything else the source sends is kept with an inferred type
+SCHEMAS = {
+    "whoop_cycles": {
+        "date_col": "start",
+        "key": "id",
+        "columns": {
+            "id": pa.int64(), "start": pa.timestamp('ms'), "end": pa.timestamp('ms'),
+            "created_at": pa.timestamp('ms'), "updated_at": pa.timestamp('ms'),
+            "timezone_offset": pa.string(), "score_state": pa.string(),
+            "score_strain": pa.float64(), "score_kilojoule": pa.float64(),
+            "score_average_heart_rate": pa.float64(), "score_max_heart_rate": pa.float64()
+        }
+    },
+    "whoop_recovery": {
+        "date_col": "created_at",
+        "key": "cycle_id",
+        "columns": {
+            "cycle_id": pa.int64(), "sleep_id": pa.string(),
+            "created_at": pa.timestamp('ms'), "updated_at": pa.timestamp('ms'),
+            "score_state": pa.string(), "score_user_calibrating": pa.bool_(),
+            "score_recovery_score": pa.float64(), "score_resting_heart_rate": pa.float64(),
+            "score_hrv_rmssd_milli": pa.float64(), "score_spo2_percentage": pa.float64(),
+            "score_skin_temp_celsius": pa.float64()
+        }
+    },
+    "whoop_sleep": {
+        "date_col": "start",
+        "key": "id",
+        "columns": {
+            "id": pa.string(), "cycle_id": pa.int64(), "nap": pa.bool_(),
+            "start": pa.timestamp('ms'), "end": pa.timestamp('ms'),
+            "created_at": pa.timestamp('ms'), "updated_at": pa.timestamp('ms'),
+            "timezone_offset": pa.string(), "score_state": pa.string(),
+            "score_stage_summary_total_in_bed_time_milli": pa.float64(),
+            "score_stage_summary_total_awake_time_milli": pa.float64(),
+            "score_stage_summary_total_light_sleep_time_milli": pa.float64(),
+            "score_stage_summary_total_slow_wave_sleep_time_milli": pa.float64(),
+            "score_stage_summary_total_rem_sleep_time_milli": pa.float64(),
+            "score_stage_summary_disturbance_count": pa.float64(),
+            "score_respiratory_rate": pa.float64(),
+            "score_sleep_performance_percentage": pa.float64(),
+            "score_sleep_consistency_percentage": pa.float64(),
+            "score_sleep_efficiency_percentage": pa.float64()
+        }
+    },
+    "whoop_workouts": {
+        "date_col": "start",
+        "key": "id",
+        "columns": {
+            "id": pa.string(), "sport_name": pa.string(),
+            "start": pa.timestamp('ms'), "end": pa.timestamp('ms'),
+            "created_at": pa.timestamp('ms'), "updated_at": pa.timestamp('ms'),
+            "timezone_offset": pa.string(), "score_state": pa.string(),
+            "score_strain": pa.float64(), "score_kilojoule": pa.float64(),
+            "score_average_heart_rate": pa.float64(), "score_max_heart_rate": pa.float64(),
+            "score_distance_meter": pa.float64()
+        }
+    },
+    # MyNetDiary / Google Sheet columns are user-defined: only the date is typed
+    "nutrition": {"date_col": None, "key": None, "columns": {}},
+    "vitals": {"date_col": None, "key": None, "columns": {}}
+}
+
+def partition_key(source, year, month):
+    return f"{LAKE_PREFIX}/{source}/year={year:04d}/month={month:02d}/data.parquet"
+
+def months_between(start, end):
+    """ [(year, month), ...] touched by the inclusive range """
+    months = []
+    y, m = start.year, start.month
+    while (y, m) <= (end.year, end.month):
+        months.append((y, m))
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+    return months
+
+def detect_date_col(source, columns):
+    date_col = SCHEMAS[source]['date_col']
+    if date_col: return date_col if date_col in columns else None
+    for c in columns:
+        if 'date' in c.lower(): return c
+    return None
+
+def to_naive_utc(series):
+    return pd.to_datetime(series, errors='coerce', utc=True).dt.tz_localize(None)
+
+def naive_ts(value):
+    ts = pd.Timestamp(value)
+    return ts.tz_convert(None) if ts.tzinfo else ts
+
+def conform(source, df):
+    """ Applies the source schema; untyped text columns that are fully numeric become numbers """
+    typed = SCHEMAS[source]['columns']
+    df = df.copy()
+    for col, pa_type in typed.items():
+        if col not in df.columns:
+            df[col] = None
+        if pa.types.is_timestamp(pa_type):
+            df[col] = to_naive_utc(df[col])
+        elif pa.types.is_floating(pa_type):
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+        elif pa.types.is_integer(pa_type):
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('Int64')
+        elif pa.types.is_boolean(pa_type):
+            df[col] = df[col].astype('boolean')
+        else:
+            df[col] = df[col].astype('string')
+
+    for col in df.columns:
+        if col in typed: continue
+        if not (pd.api.types.is_object_dtype(df[col]) or pd.api.types.is_string_dtype(df[col])): continue
+        blank = df[col].isna() | (df[col].astype(str).str.strip() == '')
+        numeric = pd.to_numeric(df[col].where(~blank), errors='coerce')
+        if numeric[~blank].notna().all():
+            df[col] = numeric
+        else:
+            df[col] = df[col].where(~blank).astype('string')
+    return df
+
+def read_partition(s3, bucket, key, columns=None):
+    data = biostack_storage.get_bytes(s3, bucket, key)
+    if data is None:
+        return None
+    table = pq.read_table(io.BytesIO(data), columns=columns)
+    return table.to_pandas()
+
+def write_source(s3, bucket, source, records, start=None, end=None):
+    """
+    Upserts records (list of dicts or DataFrame) into the month partitions they fall in.
+    start/end: the window this batch is authoritative for (keyless sources only).
+    """
+    df = records if isinstance(records, pd.DataFrame) else pd.json_normalize(records, sep='_')
+    if df.empty: return 0
+
+    date_col = detect_date_col(source, df.columns)
+    if not date_col:
+        print(f"⚠️ Lake: no date column for '{source}', skipping Parquet write.")
+        return 0
+
+    df = df.copy()
+    df[date_col] = to_naive_utc(df[date_col])
+    df = conform(source, df.dropna(subset=[date_col]))
+    key_col = SCHEMAS[source]['key']
+
+    written = 0
+    for (year, month), part in df.groupby([df[date_col].dt.year, df[date_col].dt.month]):
+        s3_key = partition_key(source, year, month)
+        existing = read_partition(s3, bucket, s3_key)
+        if existing is not None and not existing.empty:
+            if key_col:
+                existing = existing[~existing[key_col].isin(part[key_col])]
+            elif start is not None and end is not None:
+                inside = (existing[date_col] >= naive_ts(start)) & (existing[date_col] <= naive_ts(end))
+                existing = existing[~inside]
+            part = conform(source, pd.concat([existing, part], ignore_index=True))
+
+        part = part.sort_values(by=date_col)
+        buf = io.BytesIO()
+        pq.write_table(pa.Table.from_pandas(part, preserve_index=False), buf, compression=COMPRESSION)
+        s3.put_object(Bucket=bucket, Key=s3_key, Body=buf.getvalue(), ContentType='application/vnd.apache.parquet')
+        written += len(part)
+
+    print(f"🧱 Lake: '{source}' partitions updated ({written} rows across {df[date_col].dt.to_period('M').nunique()} month(s))")
+    return written
+
+def read_range(s3, bucket, source, start, end, columns=None):
+    """ Reads only the month partitions (and columns) overlapping [start, end] """
+    date_col = SCHEMAS[source]['date_col']
+    start = naive_ts(start).normalize()
+    end = naive_ts(end).normalize() + timedelta(days=1)
+
+    frames = []
+    for year, month in months_between(start, end - timedelta(microseconds=1)):
+        cols = None
+        if columns:
+            cols = list(columns)
+            if date_col and date_col not in cols: cols.append(date_col)
+        try:
+            part = read_partition(s3, bucket, partition_key(source, year, month), columns=cols)
+        except (pa.ArrowInvalid, KeyError):
+            # Older partition missing a requested column: fall back to reading it whole
+            part = read_partition(s3, bucket, partition_key(source, year, month))
+            if part is not None and cols: part = part[[c for c in cols if c in part.columns]]
+        if part is None or part.empty: continue
+
+        col = date_col or detect_date_col(source, part.columns)
+        if col:
+            part = part[(part[col] >= start) & (part[col] < end)]
+        frames.append(part)
+
+    if not frames: return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
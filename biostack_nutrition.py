@@ -1,13 +1,15 @@
 import os
 import time
 import glob
-import json
 import boto3
 import argparse
 import pandas as pd
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
+import biostack_lake
+import biostack_storage
+
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
@@ -231,13 +233,15 @@ def process_and_upload(csv_paths, start_date, end_date):
         key = f"nutrition/nutrition_{timestamp_start}_to_{timestamp_end}.json"
         
         print(f"🚀 Uploading {len(data)} merged records to S3...")
-        s3.put_object(
-            Bucket=BUCKET_NAME,
-            Key=key,
-            Body=json.dumps(data, default=str),
-            ContentType='application/json'
-        )
+        etag = biostack_storage.put_json(s3, BUCKET_NAME, key, data, default=str)
         print(f"✅ SUCCESS: s3://{BUCKET_NAME}/{key}")
+        biostack_storage.register_object(s3, BUCKET_NAME, 'nutrition', key, start_date, end_date, etag, len(data))
+        
+        # Columnar copy: replaces this window inside the month partitions it touches
+        try:
+            biostack_lake.write_source(s3, BUCKET_NAME, 'nutrition', df, start_date, end_date)
+        except Exception as e:
+            print(f"⚠️ Lake write failed: {e}")
         
     except Exception as e:
         print(f"❌ Processing Error: {e}")
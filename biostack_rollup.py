@@ -0,0 +1,182 @@
+import os
+import argparse
+import pandas as pd
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+
+import biostack_storage
+
+load_dotenv()
+
+# --- CONFIG ---
+BUCKET_NAME = os.getenv('BIOSTACK_BUCKET_NAME')
+ROLLUP_KEY = 'rollups/daily_metrics.json'
+ROLLUP_VERSION = 1
+
+# metric -> (analyst block, column)
+METRICS = {
+    'hrv': ('whoop_daily', 'hrv_rmssd_milli'),
+    'rhr': ('whoop_daily', 'resting_heart_rate'),
+    'recovery': ('whoop_daily', 'recovery_score'),
+    'strain': ('whoop_daily', 'strain'),
+    'sleep_hours': ('whoop_daily', 'hours_sleep'),
+    'calories': ('nutrition_daily_totals', 'calories')
+}
+WINDOWS = [7, 28, 90]
+EWMA_SPANS = [7, 28]
+
+# Per metric, one row per observed day, stored column-wise:
+#   days / value                    the daily observation
+#   n / sum / sq                    running (prefix) count, sum and sum of squares of (value - shift)
+#   ewma_<span>                     exponentially weighted mean up to and including the day
+# Any window [a, b] is then prefix[b] - prefix[a-1]: mean and variance without touching the raw days.
+
+def empty_table(shift):
+    table = {'shift': shift, 'days': [], 'value': [], 'n': [], 'sum': [], 'sq': []}
+    for span in EWMA_SPANS:
+        table[f'ewma_{span}'] = []
+    return table
+
+def load(s3, bucket):
+    data = biostack_storage.read_json(s3, bucket, ROLLUP_KEY)
+    if not data or data.get('version') != ROLLUP_VERSION:
+        return {'version': ROLLUP_VERSION, 'metrics': {}}
+    return data
+
+def save(s3, bucket, rollups):
+    return biostack_storage.put_json(s3, bucket, ROLLUP_KEY, rollups)
+
+def daily_series(blocks):
+    """ (name, DataFrame) analyst blocks -> {metric: {day_str: value}} """
+    frames = dict(blocks)
+    series = {}
+    for metric, (block, col) in METRICS.items():
+        df = frames.get(block)
+        if df is None or df.empty or 'day_str' not in df.columns or col not in df.columns:
+            continue
+        values = pd.to_numeric(df[col], errors='coerce')
+        daily = values.groupby(df['day_str']).mean().dropna()
+        if not daily.empty:
+            series[metric] = {day: round(float(v), 4) for day, v in daily.items()}
+    return series
+
+def merge_metric(table, new_values):
+    """
+    Merges {day: value} into a metric table, recomputing prefixes only from the
+    earliest changed day onward. Returns the number of rows recomputed.
+    """
+    days, values = table['days'], table['value']
+    current = dict(zip(days, values))
+    changed = [d for d, v in new_values.items() if current.get(d) != v]
+    if not changed:
+        return 0
+
+    first = min(changed)
+    keep = bisect_left(days, first)
+    current.update(new_values)
+    tail = sorted(d for d in current if d >= first)
+
+    for col in table:
+        if isinstance(table[col], list):
+            del table[col][keep:]
+
+    shift = table['shift']
+    n = table['n'][-1] if keep else 0
+    total = table['sum'][-1] if keep else 0.0
+    sq = table['sq'][-1] if keep else 0.0
+    ewma = {span: (table[f'ewma_{span}'][-1] if keep else None) for span in EWMA_SPANS}
+
+    for day in tail:
+        v = current[day]
+        x = v - shift
+        n, total, sq = n + 1, total + x, sq + x * x
+        table['days'].append(day)
+        table['value'].append(v)
+        table['n'].append(n)
+        table['sum'].append(round(total, 6))
+        table['sq'].append(round(sq, 6))
+        for span in EWMA_SPANS:
+            alpha = 2 / (span + 1)
+            prev = ewma[span]
+            ewma[span] = v if prev is None else prev + alpha * (v - prev)
+            table[f'ewma_{span}'].append(round(ewma[span], 4))
+    return len(tail)
+
+def update(s3, bucket, series):
+    """ Folds new daily values into the stored rollups; writes only if something changed """
+    rollups = load(s3, bucket)
+    recomputed = 0
+    for metric, values in series.items():
+        if not values: continue
+        table = rollups['metrics'].get(metric)
+        if table is None:
+            table = rollups['metrics'][metric] = empty_table(values[min(values)])
+        recomputed += merge_metric(table, values)
+    if recomputed:
+        save(s3, bucket, rollups)
+        print(f"📈 Rollups: {recomputed} day-rows recomputed across {len(series)} metric(s)")
+    return rollups
+
+def window_stats(table, end_day, days):
+    """ (n, mean, sd) over the calendar window of `days` days ending on end_day (inclusive) """
+    start_day = (datetime.strptime(end_day, '%Y-%m-%d') - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+    hi = bisect_right(table['days'], end_day) - 1
+    lo = bisect_left(table['days'], start_day) - 1
+    if hi < 0 or hi <= lo:
+        return 0, None, None
+
+    def prefix(col, i):
+        return table[col][i] if i >= 0 else 0
+    n = prefix('n', hi) - prefix('n', lo)
+    s = prefix('sum', hi) - prefix('sum', lo)
+    q = prefix('sq', hi) - prefix('sq', lo)
+    mean = table['shift'] + s / n
+    sd = (max(q - s * s / n, 0.0) / (n - 1)) ** 0.5 if n > 1 else None
+    return n, mean, sd
+
+def baseline_frame(rollups, as_of):
+    """
+    One row per metric: latest value on/before as_of, its 7/28/90-day baselines
+    (windows end the day before, so today does not bias its own baseline), EWMAs and z-scores.
+    """
+    as_of = pd.Timestamp(as_of).strftime('%Y-%m-%d')
+    rows = []
+    for metric, table in rollups.get('metrics', {}).items():
+        i = bisect_right(table['days'], as_of) - 1
+        if i < 0: continue
+        day, value = table['days'][i], table['value'][i]
+        prior = (datetime.strptime(day, '%Y-%m-%d') - timedelta(days=1)).strftime('%Y-%m-%d')
+        row = {'metric': metric, 'day_str': day, 'value': value}
+        for w in WINDOWS:
+            n, mean, sd = window_stats(table, prior, w)
+            row[f'mean_{w}d'] = round(mean, 2) if mean is not None else None
+            row[f'sd_{w}d'] = round(sd, 2) if sd is not None else None
+            row[f'z_{w}d'] = round((value - mean) / sd, 2) if sd else None
+        for span in EWMA_SPANS:
+            row[f'ewma_{span}'] = table[f'ewma_{span}'][i]
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+def get_args():
+    parser = argparse.ArgumentParser(description="Rebuild the rolling baseline rollups from S3")
+    parser.add_argument('--seed-days', type=int, default=120, help='History to fold in (days)')
+    parser.add_argument('--end', type=str, help='End date YYYY-MM-DD (default today)')
+    return parser.parse_args()
+
+def main():
+    import biostack_analyst
+
+    args = get_args()
+    end_date = datetime.strptime(args.end, '%Y-%m-%d') if args.end else datetime.now()
+    start_date = end_date - timedelta(days=args.seed_days)
+    print(f"📈 Seeding rollups: {start_date.date()} -> {end_date.date()}")
+
+    s3 = biostack_analyst.get_s3_client()
+    loaded = biostack_analyst.load_from_s3(s3, start_date, end_date)
+    blocks = biostack_analyst.build_blocks(loaded, start_date, end_date)
+    rollups = update(s3, BUCKET_NAME, daily_series(blocks))
+    print(baseline_frame(rollups, end_date).to_string(index=False))
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,305 @@
 import os
+import re
 import json
 import time
+import queue
 import boto3
+import threading
 import argparse
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 
+import biostack_storage
+import biostack_tweets
+
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
-from selenium.common.exceptions import WebDriverException
+from selenium.common.exceptions import WebDriverException, TimeoutException
 from webdriver_manager.chrome import ChromeDriverManager
 
 load_dotenv()
 
 BUCKET_NAME = os.getenv('BIOSTACK_BUCKET_NAME')
 HANDLES = [h.strip() for h in os.getenv('X_FOLLOW_LIST', '').split(',') if h.strip()]
+# --- CHROME POOL ---
+# Workers = how many headless Chromes fit in MemAvailable (after RESERVED_MB), capped by --workers.
+CHROME_MB_PER_WORKER = int(os.getenv('BIOSTACK_CHROME_MB', '450'))
+RESERVED_MB = 400
+DEFAULT_WORKERS = 4
+RECYCLE_AFTER = 5        # handles per browser before it is replaced by a fresh one
+MEMORY_WAIT = 15         # seconds to wait for RAM before launching a browser anyway
+HANDLE_ATTEMPTS = 2
+
+# --- RSS WATCHDOG ---
+# Sum of VmRSS over chromedriver + every Chrome child (overcounts shared pages: errs on the safe side).
+# At RSS_TRIP of the limit (or when MemAvailable drops under RESERVED_MB) the handle is checkpointed,
+# the browser recycled, and scraping resumes from the oldest captured tweet via a search `until:` URL.
+CHROME_RSS_LIMIT_MB = int(os.getenv('BIOSTACK_CHROME_RSS_MB', '900'))
+RSS_TRIP = 0.85
+WATCHDOG_INTERVAL = 1.0
+MAX_RESUMES = 5
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+_driver_path = None
+_driver_lock = threading.Lock()
+
+STATUS_ID = re.compile(r'/([^/]+)/status/(\d+)')
+# Newest archived status id per handle: the next run stops scrolling once it reaches it
+CURSOR_KEY = "state/social_cursors.json"
+SCROLL_PX = 1500
+EXTRACT_MODES = ['js', 'webdriver']
+
+# One round trip per scroll: returns every article not returned before (seen-set lives in the page),
+# prunes already-captured articles when arguments[1] is set, then scrolls by arguments[0] px. Articles without a timestamp or text (ads, "show more") are skipped.
+EXTRACT_JS = """
+const seen = window.__biostackSeen || (window.__biostackSeen = new Set());
+const out = [];
+for (const art of document.querySelectorAll('article')) {
+  const time = art.querySelector('time');
+  const textEl = art.querySelector('div[data-testid="tweetText"]');
+  if (!time || !textEl) continue;
+  const ts = time.getAttribute('datetime');
+  const link = time.closest('a');
+  const match = link ? (link.getAttribute('href') || '').match(/\\/([^\\/]+)\\/status\\/(\\d+)/) : null;
+  const text = textEl.innerText;
+  const key = match ? match[2] : ts + '_' + text.slice(0, 20);
+  if (seen.has(key)) continue;
+  seen.add(key);
+  const context = art.querySelector('[data-testid="socialContext"]');
+  out.push({
+    status_id: match ? match[2] : null,
+    author: match ? match[1] : null,
+    ts: ts,
+    text: text,
+    pinned: (context ? context.innerText : art.innerText).includes('Pinned')
+  });
+}
+if (arguments[1]) {
+  // Prune captured articles above the viewport: keep the (now empty) node at its height so
+  // the timeline's virtual scroller keeps its geometry, but free the subtree (media, text, handlers)
+  for (const art of document.querySelectorAll('article:not([data-biostack-pruned])')) {
+    const box = art.getBoundingClientRect();
+    if (box.bottom > 0 || !art.querySelector('time')) continue;
+    art.style.height = box.height + 'px';
+    art.setAttribute('data-biostack-pruned', '1');
+    art.replaceChildren();
+  }
+}
+if (arguments[0]) window.scrollBy(0, arguments[0]);
+return out;
+"""
+
+# Event-driven waits (seconds): resolve as soon as new <article>s land (+SETTLE for the rest of
+# the batch), or when the DOM has been quiet for QUIET (timeline stopped growing), at worst TIMEOUT.
+WAIT_TIMEOUT = 10
+WAIT_QUIET = 1.5
+WAIT_SETTLE = 0.2
+
+# A page-lifetime MutationObserver counts added articles; each call waits for the count to pass
+# arguments[0] (what the previous wait saw). Returns {reason, added, ms}.
+WAIT_JS = """
+const [since, timeoutMs, quietMs, settleMs] = arguments;
+const done = arguments[arguments.length - 1];
+if (!window.__biostackWatch) {
+  const st = window.__biostackWatch = {added: document.querySelectorAll('article').length, listeners: new Set()};
+  new MutationObserver(records => {
+    for (const r of records) for (const n of r.addedNodes)
+      if (n.nodeType === 1 && (n.matches('article') || n.querySelector('article'))) st.added++;
+    st.listeners.forEach(fn => fn());
+  }).observe(document.documentElement, {childList: true, subtree: true});
+}
+const st = window.__biostackWatch;
+const t0 = performance.now();
+let settle = null, quiet = null, timeout = null;
+const finish = reason => {
+  st.listeners.delete(check);
+  clearTimeout(settle); clearTimeout(quiet); clearTimeout(timeout);
+  done({reason: reason, added: st.added, ms: performance.now() - t0});
+};
+const check = () => {
+  clearTimeout(quiet);
+  quiet = setTimeout(() => finish('idle'), quietMs);
+  if (st.added > since && settle === null) settle = setTimeout(() => finish('articles'), settleMs);
+};
+st.listeners.add(check);
+timeout = setTimeout(() => finish('timeout'), timeoutMs);
+check();
+"""
+
+def new_wait_stats():
+    return {'seconds': 0.0, 'waits': 0, 'timeouts': 0}
+
+def wait_for_timeline(driver, stats, since=0, timeout=WAIT_TIMEOUT, quiet=WAIT_QUIET, settle=WAIT_SETTLE):
+    """ Blocks until new articles appear / the DOM goes quiet / timeout. Returns the added-article count. """
+    t0 = time.perf_counter()
+    driver.set_script_timeout(timeout + 5)
+    try:
+        result = driver.execute_async_script(WAIT_JS, since, int(timeout * 1000), int(quiet * 1000),
+                                             int(settle * 1000)) or {}
+    except TimeoutException:
+        result = {'reason': 'timeout', 'added': since}
+    stats['seconds'] += time.perf_counter() - t0
+    stats['waits'] += 1
+    if result.get('reason') == 'timeout':
+        stats['timeouts'] += 1
+    return result.get('added', since)
+
+def permalink(time_el):
+    """ The <time> of a tweet sits inside its permalink: /<author>/status/<id> -> (author, id) """
+    try:
+        href = time_el.find_element(By.XPATH, './ancestor::a[1]').get_attribute('href') or ''
+    except Exception:
+        return None, None
+    match = STATUS_ID.search(href)
+    return (match.group(1), match.group(2)) if match else (None, None)
+
+def extract_articles_js(driver, scroll_px=0):
+    """ {status_id, ts, text, pinned} for all new articles in ONE execute_script call (prunes captured ones) """
+    return driver.execute_script(EXTRACT_JS, scroll_px, True) or []
+
+def extract_articles_webdriver(driver, scroll_px=0):
+    """ Legacy per-element extraction (~6 chromedriver round trips per article), kept for comparison """
+    rows = []
+    for art in driver.find_elements(By.TAG_NAME, "article"):
+        try:
+            time_el = art.find_element(By.TAG_NAME, "time")
+            text_el = art.find_element(By.CSS_SELECTOR, 'div[data-testid="tweetText"]')
+            author, status_id = permalink(time_el)
+            rows.append({"status_id": status_id, "author": author, "ts": time_el.get_attribute("datetime"),
+                         "text": text_el.text, "pinned": "Pinned" in art.text})
+        except: continue
+    if scroll_px:
+        driver.execute_script(f"window.scrollBy(0, {int(scroll_px)});")
+    return rows
+
+EXTRACTORS = {'js': extract_articles_js, 'webdriver': extract_articles_webdriver}
 
 def get_args():
     parser = argparse.ArgumentParser()
     parser.add_argument('--days', type=int, default=7)
     parser.add_argument('--visible', action='store_true')
     parser.add_argument('--debug', action='store_true')
+    parser.add_argument('--extract', choices=EXTRACT_MODES, default='js',
+                        help='js: one execute_script per scroll (default); webdriver: legacy per-element calls')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help='Max parallel Chrome workers (further limited by free memory)')
+    parser.add_argument('--full', action='store_true',
+                        help='Ignore the per-handle cursors and rescan back to the --days cutoff')
+    parser.add_argument('--fixture', type=str, default=None,
+                        help='Scrape a local HTML timeline (e.g. fixtures/x_timeline.html) instead of x.com; no upload')
+    parser.add_argument('--stop-at', type=int, default=None,
+                        help='With --fixture: status id cursor to stop at (exercises the cursor logic offline)')
     return parser.parse_args()
 
+def chromedriver_path():
+    """ Resolved once: concurrent ChromeDriverManager installs race on the same cache dir """
+    global _driver_path
+    with _driver_lock:
+        if _driver_path is None:
+            _driver_path = ChromeDriverManager().install()
+    return _driver_path
+
+def available_mb(path='/proc/meminfo'):
+    """ MemAvailable in MB (MemFree + Buffers + Cached on old kernels); None off Linux """
+    try:
+        with open(path) as f:
+            info = {line.split(':')[0]: int(line.split()[1]) for line in f if line.strip()}
+    except (OSError, ValueError, IndexError):
+        return None
+    kb = info.get('MemAvailable', info.get('MemFree', 0) + info.get('Buffers', 0) + info.get('Cached', 0))
+    return kb // 1024
+
+def plan_workers(n_handles, cap):
+    free = available_mb()
+    fit = cap if free is None else max(1, (free - RESERVED_MB) // CHROME_MB_PER_WORKER)
+    workers = max(1, min(n_handles, cap, fit))
+    print(f"🧮 Chrome pool: {workers} worker(s) for {n_handles} handle(s) "
+          f"({'?' if free is None else free} MB available, ~{CHROME_MB_PER_WORKER} MB per Chrome)")
+    return workers
+
+def wait_for_memory(needed_mb=CHROME_MB_PER_WORKER, timeout=MEMORY_WAIT):
+    """ Lets the OS reclaim a just-closed browser before the next one starts (polls, no fixed pause) """
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        free = available_mb()
+        if free is None or free - RESERVED_MB >= needed_mb:
+            return True
+        time.sleep(0.5)
+    return False
+
+def process_tree(root_pid):
+    """ root_pid and all its descendants, from /proc/<pid>/stat parent links """
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit(): continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # comm may contain spaces/parens: the fields after the LAST ')' are fixed
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    tree, stack = [], [root_pid]
+    while stack:
+        pid = stack.pop()
+        tree.append(pid)
+        stack.extend(children.get(pid, []))
+    return tree
+
+def tree_rss_mb(root_pid):
+    total = 0
+    for pid in process_tree(root_pid):
+        try:
+            with open(f'/proc/{pid}/statm') as f:
+                total += int(f.read().split()[1]) * PAGE_SIZE
+        except (OSError, ValueError, IndexError):
+            continue
+    return total / (1024 * 1024)
+
+class RssWatchdog:
+    """ Background sampler of the browser's process-tree RSS; `tripped` is polled once per scroll """
+    def __init__(self, driver, limit_mb=CHROME_RSS_LIMIT_MB, interval=WATCHDOG_INTERVAL):
+        process = getattr(getattr(driver, 'service', None), 'process', None)
+        self.pid = getattr(process, 'pid', None)
+        self.limit_mb, self.interval = limit_mb, interval
+        self.peak_mb = 0.0
+        self.tripped = False
+        self._stop = threading.Event()
+        self._thread = None
+        if self.pid and os.path.isdir('/proc'):
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def sample(self):
+        rss = tree_rss_mb(self.pid)
+        self.peak_mb = max(self.peak_mb, rss)
+        free = available_mb()
+        if rss >= self.limit_mb * RSS_TRIP or (free is not None and free < RESERVED_MB):
+            self.tripped = True
+        return rss
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def stop(self):
+        self._stop.set()
+
+class MemoryCheckpoint(Exception):
+    """ Raised by scrape_handle when the watchdog trips; tweets captured so far stay in the caller's dict """
+    def __init__(self, until_day):
+        super().__init__(f"browser RSS limit reached, resume until:{until_day}")
+        self.until_day = until_day
+
+def resume_url(handle, until_day, fixture_url=None):
+    """ Timeline continuation after a recycle: X search results strictly before until_day """
+    if fixture_url:
+        return f"{fixture_url}?q=until%3A{until_day}"
+    return f"https://x.com/search?q=from%3A{handle}%20until%3A{until_day}&src=typed_query&f=live"
+
 def setup_driver(headless=True):
     chrome_options = Options()
     
@@ -47,18 +321,18 @@ def setup_driver(headless=True):
     chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
     chrome_options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36")
     
-    service = Service(ChromeDriverManager().install())
+    service = Service(chromedriver_path())
     driver = webdriver.Chrome(service=service, options=chrome_options)
     driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
     return driver
 
-def inject_cookies(driver):
+def inject_cookies(driver, stats):
     cookie_path = 'twitter_cookies.json'
     if not os.path.exists(cookie_path): return False
     
     try:
         driver.get("https://x.com")
-        time.sleep(3)
+        wait_for_timeline(driver, stats, since=10 ** 9, quiet=1.0)
         with open(cookie_path, 'r') as f:
             cookies = json.load(f)
         for cookie in cookies:
@@ -66,7 +340,8 @@ def inject_cookies(driver):
             try: driver.add_cookie(c)
             except: pass
         driver.get("https://x.com/home")
-        time.sleep(4)
+        # Logged in: the home timeline renders articles; logged out: the login page goes quiet
+        wait_for_timeline(driver, stats)
         return "login" not in driver.current_url
     except Exception as e:
         print(f"Cookie injection error: {e}")
@@ -77,88 +352,226 @@ def wipe_ui(driver):
     try: driver.execute_script(js)
     except: pass
 
-def scrape_handle(driver, handle, days, debug=False):
-    driver.get(f"https://x.com/{handle}/with_replies")
-    time.sleep(6)
+def scrape_handle(driver, handle, days, debug=False, url=None, extract='js', stats=None, watchdog=None,
+                  tweets=None, stop_at=None):
+    """
+    tweets:  dict collecting results across browser recycles (status id -> tweet).
+    stop_at: newest status id already archived for this handle; scrolling stops at the first
+             settled (see below), non-pinned tweet by the handle at or below it (ids grow over time).
+    A stop candidate only counts once the next article is older than it: in /with_replies a thread
+    shows the handle's own older tweet right above each new self-reply, and stopping on that
+    conversation parent would skip the newer posts further down.
+    Returns (tweets, reached_end): reached_end is False if the scroll cap hit before the cursor/cutoff.
+    Raises MemoryCheckpoint when the watchdog trips; re-call with `url` = resume_url(...) and the same dict.
+    """
+    stats = stats if stats is not None else new_wait_stats()
+    driver.get(url or f"https://x.com/{handle}/with_replies")
+    seen_articles = wait_for_timeline(driver, stats)
     wipe_ui(driver)
     
-    unique_tweets = {}
+    unique_tweets = tweets if tweets is not None else {}
     cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+    extract_articles = EXTRACTORS[extract]
+    pending = None  # status id of the last stop candidate, until the next article settles it
     
     for scroll in range(20):
         try:
-            articles = driver.find_elements(By.TAG_NAME, "article")
-            stop_scan = False
-            for art in articles:
+            # Extracts what is on screen, then scrolls for the next batch
+            rows = extract_articles(driver, SCROLL_PX)
+            # Nothing new below a candidate: the timeline ended there, so it was not a parent
+            stop_scan = pending is not None and not rows
+            for row in rows:
+                if stop_scan: break
                 try:
-                    time_el = art.find_element(By.TAG_NAME, "time")
-                    ts = time_el.get_attribute("datetime")
+                    ts, content = row["ts"], row["text"]
                     dt_obj = pd.to_datetime(ts).to_pydatetime()
+                    status_id = int(row["status_id"]) if row["status_id"] else None
                     
-                    text_el = art.find_element(By.CSS_SELECTOR, 'div[data-testid="tweetText"]')
-                    content = text_el.text
+                    if pending is not None and status_id is not None:
+                        # Timeline back in reverse-chronological order -> the candidate was a real stop
+                        if status_id <= pending:
+                            stop_scan = True
+                        pending = None
                     
-                    t_id = f"{ts}_{content[:20]}"
+                    # Reply parents / retweets carry other authors' (older) ids: only the handle's own posts count
+                    own = (row.get("author") or "").lower() == handle.lower()
+                    if stop_at and own and status_id and not row["pinned"] and status_id <= stop_at:
+                        pending = status_id
+                        continue
+                    
+                    t_id = row["status_id"] or f"{ts}_{content[:20]}"
                     if t_id not in unique_tweets:
                         if dt_obj >= cutoff:
-                            unique_tweets[t_id] = {"ts": ts, "content": content.replace("\n", " ")}
+                            unique_tweets[t_id] = {"id": row["status_id"], "author": row.get("author"), "ts": ts,
+                                                   "content": content.replace("\n", " ")}
                             if debug: print(f"   [+] {dt_obj.strftime('%m-%d')} | {content[:60]}...")
-                        elif "Pinned" not in art.text:
+                        elif not row["pinned"] and own and status_id:
+                            pending = status_id
+                        elif not row["pinned"] and not row.get("author"):
                             stop_scan = True
                 except: continue
             
             if stop_scan: break
-            driver.execute_script("window.scrollBy(0, 1500);")
-            time.sleep(2.5) # Increased for stability
+            if watchdog and watchdog.tripped and unique_tweets:
+                oldest = min(pd.to_datetime(t["ts"]) for t in unique_tweets.values())
+                # until: is exclusive and day-granular: resume from the oldest day itself (dupes are keyed out)
+                raise MemoryCheckpoint((oldest + timedelta(days=1)).strftime('%Y-%m-%d'))
+            seen_articles = wait_for_timeline(driver, stats, since=seen_articles)
         except WebDriverException as we:
             raise we # Re-throw to handle crash in the main loop
+    else:
+        return list(unique_tweets.values()), False
             
-    return list(unique_tweets.values())
+    return list(unique_tweets.values()), True
 
-def main():
-    args = get_args()
-    master_intel = {}
-    
-    for handle in HANDLES:
-        success = False
-        retries = 0
-        
-        while not success and retries < 2:
-            print(f"📡 Processing @{handle} (Attempt {retries+1})...")
-            driver = None
+class ChromeWorker:
+    """ One reusable browser: cookies injected once, recycled after RECYCLE_AFTER handles or a crash """
+    def __init__(self, name, args, url=None):
+        self.name, self.args, self.url = name, args, url
+        self.driver = None
+        self.handles = 0
+
+    def ensure(self, waits):
+        if self.driver is not None and self.handles < RECYCLE_AFTER:
+            return True
+        self.recycle()
+        wait_for_memory()
+        self.driver = setup_driver(headless=not self.args.visible)
+        if not self.url and not inject_cookies(self.driver, waits):
+            self.recycle()
+            return False
+        return True
+
+    def recycle(self):
+        if self.driver:
+            try: self.driver.quit()
+            except: pass
+        self.driver, self.handles = None, 0
+
+    def scrape(self, handle, attempt, stop_at=None):
+        """ (tweets, complete): complete = the scan reached the cursor/cutoff, so the cursor may advance """
+        print(f"📡 [{self.name}] Processing @{handle} (Attempt {attempt})"
+              + (f", stopping at status {stop_at}..." if stop_at else "..."))
+        waits = new_wait_stats()
+        if not self.ensure(waits):
+            print(f"   ❌ [{self.name}] Cookie fail on @{handle}")
+            return None, False
+        t0 = time.perf_counter()
+        tweets, url, peak, complete = {}, self.url, 0.0, False
+        for resume in range(MAX_RESUMES + 1):
+            watchdog = RssWatchdog(self.driver)
             try:
-                driver = setup_driver(headless=not args.visible)
-                if not inject_cookies(driver):
-                    print(f"   ❌ Cookie fail on @{handle}")
-                    break
-                
-                intel = scrape_handle(driver, handle, args.days, debug=args.debug)
-                master_intel[handle] = intel
-                print(f"   ✅ Done: {len(intel)} tweets.")
-                success = True
-                
-            except WebDriverException as e:
-                retries += 1
-                print(f"   ⚠️ TAB CRASHED or Driver Failed. Retrying...")
-                time.sleep(5)
-            except Exception as fatal:
-                print(f"   ❌ Unexpected Error on @{handle}: {fatal}")
+                _, complete = scrape_handle(self.driver, handle, self.args.days, debug=self.args.debug, url=url,
+                                            extract=self.args.extract, stats=waits, watchdog=watchdog,
+                                            tweets=tweets, stop_at=stop_at)
                 break
+            except MemoryCheckpoint as cp:
+                print(f"   🧯 [{self.name}] @{handle}: Chrome at {watchdog.peak_mb:.0f} MB, checkpointed "
+                      f"{len(tweets)} tweets; recycling and resuming until:{cp.until_day}")
+                self.recycle()
+                if resume == MAX_RESUMES or not self.ensure(waits):
+                    print(f"   ⚠️ [{self.name}] @{handle}: keeping the {len(tweets)} tweets captured so far")
+                    break
+                url = resume_url(handle, cp.until_day, self.url)
             finally:
-                if driver: 
-                    try: driver.quit()
-                    except: pass
-                # Forced pause to let OS reclaim RAM
-                time.sleep(2)
+                watchdog.stop()
+                peak = max(peak, watchdog.peak_mb)
+        self.handles += 1
+        intel = list(tweets.values())
+        print(f"   ✅ [{self.name}] @{handle}: {len(intel)} tweets in {time.perf_counter() - t0:.1f}s "
+              f"({self.args.extract} extraction), waited {waits['seconds']:.1f}s over {waits['waits']} waits "
+              f"({waits['timeouts']} timeouts), peak Chrome RSS {peak:.0f} MB.")
+        return intel, complete
+
+def scrape_all(handles, args, url=None, cursors=None):
+    """
+    Handles are pulled from a shared queue by as many Chrome workers as memory allows.
+    Returns ({handle: tweets}, {handles whose scan reached the cursor/cutoff}).
+    """
+    cursors = cursors or {}
+    todo = queue.Queue()
+    for handle in handles:
+        todo.put((handle, 1))
+    results, complete, lock = {}, set(), threading.Lock()
+
+    def run(name):
+        worker = ChromeWorker(name, args, url)
+        try:
+            while True:
+                try:
+                    handle, attempt = todo.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    stop_at = int(cursors[handle]) if cursors.get(handle) else None
+                    intel, done = worker.scrape(handle, attempt, stop_at=stop_at)
+                    if intel is not None:
+                        with lock:
+                            results[handle] = intel
+                            if done: complete.add(handle)
+                except WebDriverException:
+                    worker.recycle()
+                    if attempt < HANDLE_ATTEMPTS:
+                        print(f"   ⚠️ [{name}] TAB CRASHED or Driver Failed on @{handle}. Retrying...")
+                        todo.put((handle, attempt + 1))
+                    else:
+                        print(f"   ❌ [{name}] Giving up on @{handle} after {attempt} attempts")
+                except Exception as fatal:
+                    worker.recycle()
+                    print(f"   ❌ [{name}] Unexpected Error on @{handle}: {fatal}")
+        finally:
+            worker.recycle()
+
+    t0 = time.perf_counter()
+    workers = plan_workers(len(handles), args.workers)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for future in [pool.submit(run, f"w{i + 1}") for i in range(workers)]:
+            future.result()
+    print(f"⏱️ Scraped {len(results)}/{len(handles)} handles in {time.perf_counter() - t0:.1f}s with {workers} worker(s)")
+    return results, complete
+
+def advance_cursors(cursors, intel, complete):
+    """
+    Newest own status id per handle. Only handles whose scan reached the old cursor/cutoff
+    advance: a scroll-capped scan may have left a gap below what it captured.
+    """
+    for handle in complete:
+        ids = [int(t["id"]) for t in intel.get(handle, [])
+               if t.get("id") and (t.get("author") or "").lower() == handle.lower()]
+        if ids:
+            cursors[handle] = str(max(ids + ([int(cursors[handle])] if cursors.get(handle) else [])))
+    return cursors
+
+def main():
+    args = get_args()
+    handles, url = HANDLES, None
+    if args.fixture:
+        handles, url = ['fixture'], 'file://' + os.path.abspath(args.fixture)
+    if not handles:
+        print("❌ X_FOLLOW_LIST is empty.")
+        return
+
+    s3, cursors = None, {}
+    if args.fixture and args.stop_at:
+        cursors = {'fixture': str(args.stop_at)}
+    if not args.fixture:
+        s3 = boto3.client('s3')
+        if not args.full:
+            cursors = biostack_storage.read_json(s3, BUCKET_NAME, CURSOR_KEY) or {}
+            if cursors:
+                print(f"🔖 Cursors: {cursors}")
+
+    master_intel, complete = scrape_all(handles, args, url, cursors)
+
+    if args.fixture:
+        print(f"🧪 Fixture run: {sum(len(v) for v in master_intel.values())} tweets extracted, nothing uploaded.")
+        return
 
-    # UPLOAD
+    # UPLOAD: append only tweets the archive has not seen (keyed by status id)
     if master_intel:
-        key = f"social/social_intel_{datetime.now().strftime('%Y%m%d')}.json"
-        boto3.client('s3').put_object(
-            Bucket=BUCKET_NAME, Key=key, 
-            Body=json.dumps(master_intel, indent=2)
-        )
-        print(f"🚀 SUCCESS: s3://{BUCKET_NAME}/{key}")
+        biostack_tweets.append(s3, BUCKET_NAME, master_intel)
+        # Archive first, cursors second: a crash in between only causes a harmless re-scan
+        biostack_storage.put_json(s3, BUCKET_NAME, CURSOR_KEY, advance_cursors(cursors, master_intel, complete))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,399 @@
+import os
+import re
+import gzip
+import json
+import hashlib
+import threading
+import ijson
+from ijson.common import ObjectBuilder
+from botocore.exceptions import ClientError
+from datetime import datetime, timezone
+
+# --- CONFIG ---
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+# Read-through cache for S3 objects: <sha(bucket/key/etag)>.bin, LRU by mtime
+CACHE_DIR = os.path.join(PROJECT_ROOT, '.s3_cache')
+CACHE_MAX_BYTES = int(os.getenv('BIOSTACK_CACHE_MAX_MB', '512')) * 1024 * 1024
+CACHE_ENABLED = True
+# JSON payloads are stored gzip'd with Content-Encoding: gzip (level 6: near-max ratio, fast)
+GZIP_LEVEL = 6
+GZIP_MAGIC = b'\x1f\x8b'
+STREAM_CHUNK = 1024 * 1024
+_evict_lock = threading.Lock()
+
+# One small index per source: manifests/<source>.json
+MANIFEST_PREFIX = 'manifests'
+DAY_FMT = '%Y-%m-%d'
+
+# Record fields that carry the record's date, in order of preference
+DATE_FIELDS = ['start', 'created_at', 'ts', 'Date', 'date']
+ISO_DAY = re.compile(r'^\d{4}-\d{2}-\d{2}')
+FALLBACK_DAY_FORMATS = ['%m/%d/%Y', '%Y/%m/%d', '%d.%m.%Y']
+
+def manifest_key(source):
+    return f"{MANIFEST_PREFIX}/{source}.json"
+
+def to_day(value):
+    """ datetime/date/'YYYY-MM-DD...' -> 'YYYY-MM-DD' """
+    if hasattr(value, 'strftime'):
+        return value.strftime(DAY_FMT)
+    return str(value)[:10]
+
+# --- READ-THROUGH CACHE ---
+
+def disable_cache():
+    global CACHE_ENABLED
+    CACHE_ENABLED = False
+
+def _cache_id(*parts):
+    return hashlib.sha256('/'.join(parts).encode('utf-8')).hexdigest()
+
+def _data_path(bucket, key, etag):
+    return os.path.join(CACHE_DIR, f"{_cache_id(bucket, key, etag)}.bin")
+
+def _etag_path(bucket, key):
+    """ Remembers the last ETag seen for bucket/key so we can send If-None-Match """
+    return os.path.join(CACHE_DIR, f"{_cache_id(bucket, key)}.etag")
+
+def _write_atomic(path, data):
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def _download_atomic(body, path):
+    """ Streams an S3 body to disk in chunks, never holding the whole object in memory """
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        for chunk in body.iter_chunks(STREAM_CHUNK):
+            f.write(chunk)
+    os.replace(tmp_path, path)
+
+def _touch(path):
+    """ Bumps mtime (LRU recency). False if the blob was evicted meanwhile. """
+    try:
+        os.utime(path)
+        return True
+    except OSError:
+        return False
+
+def _evict():
+    """ Drops least-recently-used blobs until the cache fits CACHE_MAX_BYTES """
+    with _evict_lock:
+        blobs = []
+        for name in os.listdir(CACHE_DIR):
+            if not name.endswith('.bin'): continue
+            path = os.path.join(CACHE_DIR, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            blobs.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in blobs)
+        for _, size, path in sorted(blobs):
+            if total <= CACHE_MAX_BYTES: break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+def cached_path(s3, bucket, key, etag=None):
+    """
+    Ensures the object is in the local cache and returns its path (None if the key does not exist).
+      * etag known (e.g. from a manifest) and cached -> no network call at all
+      * otherwise a conditional GET: 304 Not Modified costs zero bytes of egress
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    if etag and _touch(_data_path(bucket, key, etag)):
+        return _data_path(bucket, key, etag)
+
+    known_etag = None
+    if os.path.exists(_etag_path(bucket, key)):
+        with open(_etag_path(bucket, key), 'r') as f:
+            known_etag = f.read().strip() or None
+
+    kwargs = {'Bucket': bucket, 'Key': key}
+    if known_etag and os.path.exists(_data_path(bucket, key, known_etag)):
+        kwargs['IfNoneMatch'] = f'"{known_etag}"'
+    try:
+        obj = s3.get_object(**kwargs)
+    except s3.exceptions.NoSuchKey:
+        return None
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') not in ('304', 'NotModified'):
+            raise
+        if _touch(_data_path(bucket, key, known_etag)):
+            return _data_path(bucket, key, known_etag)
+        # Evicted between the check and the 304: fetch it for real
+        obj = s3.get_object(Bucket=bucket, Key=key)
+
+    fresh_etag = obj['ETag'].strip('"')
+    path = _data_path(bucket, key, fresh_etag)
+    _download_atomic(obj['Body'], path)
+    _write_atomic(_etag_path(bucket, key), fresh_etag.encode('utf-8'))
+    _evict()
+    # A tiny cap can evict what we just wrote; the caller still gets its data
+    if not os.path.exists(path):
+        _download_atomic(s3.get_object(Bucket=bucket, Key=key)['Body'], path)
+    return path
+
+def get_bytes(s3, bucket, key, etag=None):
+    """ Raw object bytes through the local cache. Returns None if the key does not exist. """
+    if not CACHE_ENABLED:
+        try:
+            return s3.get_object(Bucket=bucket, Key=key)['Body'].read()
+        except s3.exceptions.NoSuchKey:
+            return None
+    path = cached_path(s3, bucket, key, etag=etag)
+    if path is None:
+        return None
+    with open(path, 'rb') as f:
+        return f.read()
+
+def decompress(data):
+    """ Transparent decode: gzip'd objects are sniffed by magic bytes, legacy plain JSON passes through """
+    if data[:2] == GZIP_MAGIC:
+        return gzip.decompress(data)
+    return data
+
+def read_json(s3, bucket, key, etag=None):
+    """ GET + decode one JSON object (cached). Returns None if it does not exist. """
+    data = get_bytes(s3, bucket, key, etag=etag)
+    if data is None:
+        return None
+    return json.loads(decompress(data).decode('utf-8'))
+
+# --- STREAMING DECODE ---
+
+def open_stream(s3, bucket, key, etag=None):
+    """ Decompressed, forward-only byte stream of an object (cache file or live S3 body) """
+    if CACHE_ENABLED:
+        path = cached_path(s3, bucket, key, etag=etag)
+        if path is None:
+            return None
+        f = open(path, 'rb')
+        magic = f.read(2)
+        f.seek(0)
+        return gzip.GzipFile(fileobj=f) if magic == GZIP_MAGIC else f
+    try:
+        obj = s3.get_object(Bucket=bucket, Key=key)
+    except s3.exceptions.NoSuchKey:
+        return None
+    if obj.get('ContentEncoding') == 'gzip':
+        return gzip.GzipFile(fileobj=obj['Body'])
+    return obj['Body']
+
+def _build(events, event, value):
+    """ Materialises exactly one JSON value from the parse event stream """
+    builder = ObjectBuilder()
+    builder.event(event, value)
+    depth = 1 if event in ('start_map', 'start_array') else 0
+    while depth:
+        _, event, value = next(events)
+        builder.event(event, value)
+        if event in ('start_map', 'start_array'):
+            depth += 1
+        elif event in ('end_map', 'end_array'):
+            depth -= 1
+    return builder.value
+
+def _iter_array(events, windows):
+    """ Yields the in-window elements of the array whose start_array was just consumed """
+    for _, event, value in events:
+        if event == 'end_array':
+            return
+        record = _build(events, event, value)
+        if in_windows(record, windows):
+            yield record
+
+def stream_filtered(stream, windows):
+    """
+    Parses a list payload (nutrition, vitals) or a dict-of-lists payload (whoop,
+    social) record by record, keeping only records inside `windows`. Peak memory
+    is the kept records plus one record, not the whole document.
+    """
+    events = ijson.parse(stream, use_float=True)
+    first = next(events, None)
+    if first is None:
+        return None
+    _, event, value = first
+    if event == 'start_array':
+        return list(_iter_array(events, windows))
+    if event != 'start_map':
+        return value
+
+    result = {}
+    for prefix, event, value in events:
+        if event == 'map_key' and prefix == '':
+            _, inner_event, inner_value = next(events)
+            if inner_event == 'start_array':
+                result[value] = list(_iter_array(events, windows))
+            else:
+                result[value] = _build(events, inner_event, inner_value)
+        elif event == 'end_map' and prefix == '':
+            break
+    return result
+
+def read_json_window(s3, bucket, key, start, end, etag=None):
+    """ Streaming equivalent of read_json that drops records outside [start, end] while parsing """
+    return read_json_windows(s3, bucket, key, [(to_day(start), to_day(end))], etag=etag)
+
+def read_json_windows(s3, bucket, key, windows, etag=None):
+    stream = open_stream(s3, bucket, key, etag=etag)
+    if stream is None:
+        return None
+    with stream:
+        return stream_filtered(stream, windows)
+
+def put_json(s3, bucket, key, data, **dumps_kwargs):
+    """ PUT one gzip'd JSON object, returns its ETag """
+    body = json.dumps(data, separators=(',', ':'), **dumps_kwargs).encode('utf-8')
+    res = s3.put_object(
+        Bucket=bucket,
+        Key=key,
+        Body=gzip.compress(body, compresslevel=GZIP_LEVEL),
+        ContentType='application/json',
+        ContentEncoding='gzip'
+    )
+    return res.get('ETag', '').strip('"')
+
+# --- MANIFEST ---
+
+def read_manifest(s3, bucket, source):
+    return read_json(s3, bucket, manifest_key(source))
+
+def register_object(s3, bucket, source, key, start, end, etag, records):
+    """
+    Records that `key` holds `source` data for [start, end].
+    Re-registering a key (e.g. a rewritten store object) replaces its entry.
+    """
+    manifest = read_manifest(s3, bucket, source) or {'source': source, 'entries': []}
+    entries = [e for e in manifest['entries'] if e['key'] != key]
+    entries.append({
+        'key': key,
+        'start': to_day(start),
+        'end': to_day(end),
+        'etag': etag,
+        'records': records,
+        'written_at': datetime.now(timezone.utc).isoformat()
+    })
+    manifest['entries'] = sorted(entries, key=lambda e: (e['start'], e['end']))
+    put_json(s3, bucket, manifest_key(source), manifest)
+    print(f"🗂️  Manifest: {source} -> {key} ({to_day(start)} .. {to_day(end)}, {records} records)")
+
+def subtract_window(windows, start, end):
+    """ Removes [start, end] (inclusive days) from a list of (start, end) windows """
+    out = []
+    for w_start, w_end in windows:
+        if end < w_start or start > w_end:
+            out.append((w_start, w_end))
+            continue
+        if w_start < start:
+            out.append((w_start, shift_day(start, -1)))
+        if end < w_end:
+            out.append((shift_day(end, 1), w_end))
+    return out
+
+def shift_day(day, delta):
+    d = datetime.strptime(day, DAY_FMT).toordinal() + delta
+    return datetime.fromordinal(d).strftime(DAY_FMT)
+
+def resolve_range(manifest, start, end):
+    """
+    Picks the objects covering [start, end]. Newest writes win: each selected entry
+    is returned with the sub-windows it is authoritative for, so overlapping exports
+    never double-count a day. Returns [(entry, [(start_day, end_day), ...]), ...].
+    """
+    uncovered = [(to_day(start), to_day(end))]
+    selected = []
+    for entry in sorted(manifest.get('entries', []), key=lambda e: e['written_at'], reverse=True):
+        if not uncovered: break
+        owned = []
+        for w_start, w_end in uncovered:
+            lo, hi = max(w_start, entry['start']), min(w_end, entry['end'])
+            if lo <= hi: owned.append((lo, hi))
+        if not owned: continue
+        selected.append((entry, owned))
+        for lo, hi in owned:
+            uncovered = subtract_window(uncovered, lo, hi)
+    return selected
+
+def record_day(record):
+    """ Best-effort 'YYYY-MM-DD' for a raw record, None if it has no recognisable date """
+    if not isinstance(record, dict): return None
+    fields = [f for f in DATE_FIELDS if f in record]
+    fields += [f for f in record if 'date' in f.lower() and f not in fields and f != 'updated_at']
+    for f in fields:
+        value = record.get(f)
+        if not value: continue
+        if hasattr(value, 'strftime'): return value.strftime(DAY_FMT)
+        value = str(value).strip()
+        if ISO_DAY.match(value): return value[:10]
+        for fmt in FALLBACK_DAY_FORMATS:
+            try:
+                return datetime.strptime(value.split(' ')[0], fmt).strftime(DAY_FMT)
+            except ValueError:
+                continue
+    return None
+
+def in_windows(record, windows):
+    """ Records without a recognisable date are always kept """
+    day = record_day(record)
+    return day is None or any(lo <= day <= hi for lo, hi in windows)
+
+def clip_records(records, windows):
+    return [r for r in records if in_windows(r, windows)]
+
+def merge_payloads(parts):
+    """
+    parts: [(payload, windows)]. Lists are concatenated, dicts of lists (whoop
+    categories, social handles) are merged per key; each part only contributes
+    records inside the windows it owns.
+    """
+    merged = None
+    for payload, windows in parts:
+        if isinstance(payload, dict):
+            merged = merged if isinstance(merged, dict) else {}
+            for k, records in payload.items():
+                clipped = clip_records(records, windows) if isinstance(records, list) else records
+                if isinstance(clipped, list):
+                    merged.setdefault(k, []).extend(clipped)
+                else:
+                    merged[k] = clipped
+        elif isinstance(payload, list):
+            merged = merged if isinstance(merged, list) else []
+            merged.extend(clip_records(payload, windows))
+    return merged
+
+def load_range(s3, bucket, source, start, end):
+    """
+    Resolves the data covering [start, end] via the source manifest (one GET)
+    and loads every object it points to. Returns (payload, keys) or (None, None)
+    when the source has no manifest yet.
+    """
+    manifest = read_manifest(s3, bucket, source)
+    if not manifest:
+        return None, None
+    selection = resolve_range(manifest, start, end)
+    if not selection:
+        return None, []
+
+    parts = []
+    for entry, windows in selection:
+        payload = read_json_windows(s3, bucket, entry['key'], windows, etag=entry.get('etag'))
+        if payload is not None:
+            parts.append((payload, windows))
+    if not parts:
+        return None, []
+    return merge_payloads(parts), [entry['key'] for entry, _ in selection]
+
+def range_versions(s3, bucket, source, start, end):
+    """
+    Identity of the data covering [start, end] without loading it: [(key, etag, windows)]
+    from the manifest, or None when the source has no manifest yet.
+    """
+    manifest = read_manifest(s3, bucket, source)
+    if not manifest:
+        return None
+    return [(entry['key'], entry.get('etag'), windows) for entry, windows in resolve_range(manifest, start, end)]
@@ -0,0 +1,202 @@
+import os
+import re
+import time
+import argparse
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+
+import biostack_storage
+
+load_dotenv()
+
+# --- CONFIG ---
+BUCKET_NAME = os.getenv('BIOSTACK_BUCKET_NAME')
+# Append-only archive: tweets/segments/<n>.json hold each run's NEW tweets (never rewritten),
+# tweets/index.json maps status id -> segment and term/handle/day -> status ids.
+ARCHIVE_PREFIX = 'tweets'
+INDEX_KEY = f"{ARCHIVE_PREFIX}/index.json"
+INDEX_VERSION = 1
+
+# Protocol vocabulary: a tweet mentioning any word of a topic is also indexed under '#<topic>'
+TOPICS = {
+    'sleep': ['sleep', 'insomnia', 'melatonin', 'circadian', 'nap', 'naps', 'bedtime', 'apnea'],
+    'hrv': ['hrv', 'variability', 'vagal', 'parasympathetic', 'rmssd'],
+    'rhr': ['rhr', 'resting'],
+    'creatine': ['creatine'],
+    'supplements': ['supplement', 'supplements', 'magnesium', 'creatine', 'omega', 'ashwagandha', 'nmn', 'nad',
+                    'vitamin', 'zinc', 'glycine', 'theanine', 'apigenin', 'taurine', 'metformin', 'rapamycin'],
+    'caffeine': ['caffeine', 'coffee', 'adenosine'],
+    'light': ['sunlight', 'light', 'sunrise', 'blue'],
+    'exercise': ['zone', 'vo2', 'vo2max', 'cardio', 'strength', 'training', 'workout', 'lifting', 'hiit'],
+    'nutrition': ['protein', 'fasting', 'glucose', 'carbs', 'fiber', 'alcohol', 'keto', 'insulin', 'calories'],
+    'temperature': ['cold', 'sauna', 'plunge', 'heat'],
+    'longevity': ['longevity', 'aging', 'healthspan', 'lifespan', 'mortality']
+}
+STOPWORDS = {
+    'the', 'and', 'for', 'you', 'your', 'are', 'was', 'this', 'that', 'with', 'have', 'has', 'not', 'but',
+    'from', 'they', 'what', 'just', 'can', 'all', 'our', 'out', 'about', 'more', 'will', 'one', 'its',
+    'it\'s', 'how', 'who', 'get', 'when', 'than', 'then', 'there', 'their', 'been', 'also', 'https', 'http'
+}
+WORD = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+SHORT_TERMS = {w for words in TOPICS.values() for w in words if len(w) < 3}
+
+def tokenize(text):
+    words = WORD.findall(str(text).lower())
+    return {w for w in words if (len(w) >= 3 or w in SHORT_TERMS) and w not in STOPWORDS}
+
+def terms_for(text):
+    """ Words + '#topic' tags for one tweet """
+    words = tokenize(text)
+    tags = {f"#{topic}" for topic, vocab in TOPICS.items() if words.intersection(vocab)}
+    return words | tags
+
+def empty_index():
+    return {'version': INDEX_VERSION, 'segments': [], 'docs': {}, 'terms': {}, 'handles': {}, 'days': {}}
+
+def load_index(s3, bucket):
+    """ Raw (JSON) index, or None if the archive does not exist yet """
+    index = biostack_storage.read_json(s3, bucket, INDEX_KEY)
+    if index and index.get('version') != INDEX_VERSION:
+        return None
+    return index
+
+def index_etag(s3, bucket):
+    """ Cheap version of the archive (HEAD), None if it does not exist """
+    try:
+        return s3.head_object(Bucket=bucket, Key=INDEX_KEY)['ETag'].strip('"')
+    except Exception:
+        return None
+
+def add_posting(postings, term, status_id):
+    postings.setdefault(term, []).append(status_id)
+
+def append(s3, bucket, intel):
+    """
+    intel: {handle: [{'id', 'ts', 'content', ...}]}. Writes ONE new segment with the
+    tweets the archive has not seen (by status id) and folds them into the index.
+    Segments are append-only, but index.json is read and rewritten whole on every run
+    that adds tweets: O(archive) per run, not O(new tweets).
+    """
+    index = load_index(s3, bucket) or empty_index()
+    new, no_id = [], 0
+    for handle, tweets in intel.items():
+        for t in tweets:
+            status_id = str(t.get('id') or '')
+            if not status_id:
+                no_id += 1
+                continue
+            if status_id in index['docs']: continue
+            index['docs'][status_id] = None
+            new.append({'id': status_id, 'handle': handle, 'ts': t['ts'], 'content': t['content']})
+    if no_id:
+        print(f"⚠️ Archive: skipped {no_id} tweet(s) without a status id")
+    if not new:
+        print("🗃️ Archive: no new tweets")
+        return 0
+
+    seg_no = len(index['segments'])
+    key = f"{ARCHIVE_PREFIX}/segments/{seg_no:06d}.json"
+    etag = biostack_storage.put_json(s3, bucket, key, new)
+    days = sorted(t['ts'][:10] for t in new)
+    index['segments'].append({'key': key, 'etag': etag, 'count': len(new), 'start': days[0], 'end': days[-1]})
+
+    for t in new:
+        status_id, day = t['id'], t['ts'][:10]
+        index['docs'][status_id] = seg_no
+        add_posting(index['handles'], t['handle'], status_id)
+        add_posting(index['days'], day, status_id)
+        for term in terms_for(t['content']):
+            add_posting(index['terms'], term, status_id)
+
+    biostack_storage.put_json(s3, bucket, INDEX_KEY, index)
+    print(f"🗃️ Archive: +{len(new)} tweets -> {key} ({len(index['docs'])} total)")
+    return len(new)
+
+class TweetIndex:
+    """ In-memory view of index.json: posting lists as sets for constant-time intersections """
+    def __init__(self, raw):
+        self.segments = raw['segments']
+        self.docs = raw['docs']
+        self.terms = {t: set(ids) for t, ids in raw['terms'].items()}
+        self.handles = {h: set(ids) for h, ids in raw['handles'].items()}
+        self.days = {d: set(ids) for d, ids in raw['days'].items()}
+        self.day_of = {i: d for d, ids in raw['days'].items() for i in ids}
+
+    def lookup(self, terms=None, handles=None, start=None, end=None):
+        """
+        Status ids matching ANY of `terms` (topic names, '#topic' or plain words),
+        posted by ANY of `handles`, within [start, end] (days). Newest first.
+        """
+        result = None
+        if start is not None or end is not None:
+            lo = biostack_storage.to_day(start) if start is not None else ''
+            hi = biostack_storage.to_day(end) if end is not None else '9999'
+            result = set().union(*(ids for d, ids in self.days.items() if lo <= d <= hi))
+        if handles:
+            matched = set().union(*(self.handles.get(h.lstrip('@'), set()) for h in handles))
+            result = matched if result is None else result & matched
+        if terms:
+            keys = [f"#{t}" if t in TOPICS else t.lower() for t in terms]
+            matched = set().union(*(self.terms.get(k, set()) for k in keys))
+            result = matched if result is None else result & matched
+        if result is None:
+            result = set(self.docs)
+        return sorted(result, key=lambda i: (self.day_of.get(i, ''), int(i) if i.isdigit() else 0), reverse=True)
+
+    def fetch(self, s3, bucket, ids):
+        """ Loads the matching tweets, one (cached) GET per segment touched """
+        wanted = {}
+        for i in ids:
+            wanted.setdefault(self.docs[i], set()).add(i)
+        found = {}
+        for seg_no, seg_ids in wanted.items():
+            seg = self.segments[seg_no]
+            for t in biostack_storage.read_json(s3, bucket, seg['key'], etag=seg.get('etag')) or []:
+                if t['id'] in seg_ids:
+                    found[t['id']] = t
+        return [found[i] for i in ids if i in found]
+
+def search(s3, bucket, topics=None, start=None, end=None, handles=None):
+    """ {handle: [{id, ts, content}]} (the snapshot payload shape) for the matching tweets, or None without an archive """
+    raw = load_index(s3, bucket)
+    if raw is None:
+        return None
+    # Building the sets costs O(archive) and dominates a single query: time it with the lookup
+    t0 = time.perf_counter()
+    index = TweetIndex(raw)
+    build_ms = (time.perf_counter() - t0) * 1000
+    ids = index.lookup(terms=topics, handles=handles, start=start, end=end)
+    query_ms = (time.perf_counter() - t0) * 1000
+    tweets = index.fetch(s3, bucket, ids)
+    print(f"   Reading tweets archive: {len(ids)} match(es) of {len(index.docs)} in {query_ms:.3f} ms "
+          f"(index build {build_ms:.3f} ms)")
+    payload = {}
+    for t in tweets:
+        payload.setdefault(t['handle'], []).append({'id': t['id'], 'ts': t['ts'], 'content': t['content']})
+    return payload
+
+def get_args():
+    parser = argparse.ArgumentParser(description="Query the expert tweet archive")
+    parser.add_argument('--topics', type=str, default='', help=f"Comma-separated: {', '.join(TOPICS)} or plain words")
+    parser.add_argument('--handles', type=str, default='', help='Comma-separated handles')
+    parser.add_argument('--days', type=int, default=30)
+    return parser.parse_args()
+
+def main():
+    import boto3
+
+    args = get_args()
+    end = datetime.now()
+    topics = [t.strip() for t in args.topics.split(',') if t.strip()]
+    handles = [h.strip() for h in args.handles.split(',') if h.strip()]
+    payload = search(boto3.client('s3'), BUCKET_NAME, topics=topics, start=end - timedelta(days=args.days), end=end,
+                     handles=handles)
+    if payload is None:
+        print("❌ No archive yet: run biostack_social.py first.")
+        return
+    for handle, tweets in payload.items():
+        for t in tweets:
+            print(f"@{handle} {t['ts'][:10]} | {t['content'][:100]}")
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,13 @@
 import os
-import json
 import boto3
 import argparse
 import pandas as pd
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
+import biostack_lake
+import biostack_storage
+
 # Google API Imports
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
@@ -116,13 +118,14 @@ def process_and_upload(rows, start_date, end_date):
             s3 = get_s3_client()
             key = f"vitals/vitals_{start_date.strftime('%Y%m%d')}_to_{end_date.strftime('%Y%m%d')}.json"
             
-            s3.put_object(
-                Bucket=BUCKET_NAME,
-                Key=key,
-                Body=json.dumps(final_data),
-                ContentType='application/json'
-            )
+            etag = biostack_storage.put_json(s3, BUCKET_NAME, key, final_data)
             print(f"✅ Success: s3://{BUCKET_NAME}/{key}")
+            biostack_storage.register_object(s3, BUCKET_NAME, 'vitals', key, start_date, end_date, etag, len(final_data))
+            
+            try:
+                biostack_lake.write_source(s3, BUCKET_NAME, 'vitals', df_filtered, start_date, end_date)
+            except Exception as e:
+                print(f"⚠️ Lake write failed: {e}")
         else:
             print("⚠️ No data matches that specific date range.")
     else:
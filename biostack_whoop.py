@@ -5,9 +5,22 @@ import boto3
 import argparse
 import secrets
 import time
+import random
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 
+import biostack_lake
+import biostack_storage
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, in-process lock still applies
+    fcntl = None
+
 load_dotenv()
 
 # --- CONFIG ---
@@ -16,6 +29,8 @@ CLIENT_SECRET = os.getenv('WHOOP_CLIENT_SECRET')
 BUCKET_NAME = os.getenv('BIOSTACK_BUCKET_NAME')
 REDIRECT_URI = 'http://localhost'
 TOKEN_FILE = 'whoop_tokens.json'
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+BACKFILL_DIR = os.path.join(PROJECT_ROOT, 'whoop_backfill')
 
 AUTH_URL = "https://api.prod.whoop.com/oauth/oauth2/auth"
 TOKEN_URL = "https://api.prod.whoop.com/oauth/oauth2/token"
@@ -28,6 +43,31 @@ ENDPOINTS = {
     "workouts": "https://api.prod.whoop.com/developer/v2/activity/workout"
 }
 
+# Incremental Sync: persistent store + per-endpoint high-water marks
+STORE_KEY = "whoop/whoop_STORE.json"
+CURSOR_KEY = "state/whoop_cursors.json"
+# Re-read this far behind each cursor so late-scored sleeps/recoveries get picked up
+INCREMENTAL_OVERLAP = timedelta(days=3)
+# Upsert identity per endpoint (recovery has no own id; it is 1:1 with its cycle)
+RECORD_KEYS = {
+    "cycles": "id",
+    "recovery": "cycle_id",
+    "sleep": "id",
+    "workouts": "id"
+}
+
+# Concurrency cap: how many endpoint pagination chains run at once
+DEFAULT_WORKERS = 4
+
+# Rate Limiting: Whoop allows 100 req/min (advertised via X-RateLimit-* headers)
+DEFAULT_RATE_LIMIT = 100
+DEFAULT_RATE_WINDOW = 60
+MAX_RETRIES = 6
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 60.0
+# Largest page size the V2 collection endpoints accept
+PAGE_LIMIT = 25
+
 # IMPORTANT: 'offline' scope allows for unattended 24/7 background refreshing
 SCOPES = "read:recovery read:cycles read:sleep read:workout offline"
 
@@ -36,8 +76,101 @@ def get_args():
     parser.add_argument('--start', type=str, help='Start Date YYYY-MM-DD')
     parser.add_argument('--end', type=str, help='End Date YYYY-MM-DD')
     parser.add_argument('--days', type=int, default=7, help='Days back')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help='Max endpoints fetched concurrently (1 = sequential)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only fetch records newer than the stored cursors and upsert into the S3 store')
+    parser.add_argument('--backfill', action='store_true',
+                        help='Fetch the range in monthly chunks (--workers at a time) with checkpoint/resume')
     return parser.parse_args()
 
+class RateLimiter:
+    """
+    Token bucket shared by every worker thread.
+    Starts at the documented quota and re-calibrates from each response's
+    X-RateLimit-Limit / -Remaining / -Reset and Retry-After headers.
+    """
+    def __init__(self, limit=DEFAULT_RATE_LIMIT, window=DEFAULT_RATE_WINDOW):
+        self.lock = threading.Lock()
+        self.capacity = float(limit)
+        self.rate = limit / window
+        self.tokens = float(limit)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.waited = 0.0
+        self.throttled = 0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """ Blocks until a request may be sent """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+                self.waited += delay
+            time.sleep(delay)
+
+    def observe(self, headers):
+        """ Aligns the bucket with what the server says is left in the current window """
+        limit, window = parse_rate_limit(headers.get('X-RateLimit-Limit'))
+        remaining = headers.get('X-RateLimit-Remaining')
+        reset = headers.get('X-RateLimit-Reset')
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            if limit:
+                self.capacity = float(limit)
+                self.rate = limit / window
+            if remaining is not None and remaining.strip().isdigit():
+                self.tokens = min(self.tokens, float(remaining))
+                if int(remaining) == 0 and reset and reset.strip().isdigit():
+                    self.blocked_until = max(self.blocked_until, now + int(reset))
+
+    def backoff(self, attempt, headers):
+        """ Pauses ALL workers after a 429: Retry-After if given, else capped exponential + full jitter """
+        retry_after = headers.get('Retry-After')
+        if retry_after and retry_after.strip().isdigit():
+            delay = float(retry_after)
+        else:
+            delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * (2 ** attempt)))
+        with self.lock:
+            self.throttled += 1
+            self.tokens = 0.0
+            self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+        return delay
+
+def parse_rate_limit(value):
+    """ '100, 100;window=60, 10000;window=86400' -> (100, 60): the tightest (shortest) window """
+    if not value: return None, None
+    best = None
+    for part in value.split(','):
+        fields = part.strip().split(';')
+        if not fields[0].strip().isdigit(): continue
+        window = DEFAULT_RATE_WINDOW
+        for f in fields[1:]:
+            name, _, val = f.partition('=')
+            if name.strip() == 'window' and val.strip().isdigit():
+                window = int(val)
+        if best is None or window < best[1]:
+            best = (int(fields[0]), window)
+    return best or (None, None)
+
+RATE_LIMITER = RateLimiter()
+
+def get_http_session(pool_size=DEFAULT_WORKERS):
+    """ One keep-alive connection pool shared by every endpoint worker """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(pool_size, 1))
+    session.mount('https://', adapter)
+    return session
+
 def get_s3_client():
     return boto3.client(
         's3',
@@ -60,8 +193,12 @@ def save_tokens(token_data):
     existing = load_tokens() or {}
     final_data = {**existing, **token_data}
     
-    with open(TOKEN_FILE, 'w') as f:
+    # Atomic replace: a concurrent reader never sees a half-written file
+    tmp_path = f"{TOKEN_FILE}.tmp"
+    with open(tmp_path, 'w') as f:
         json.dump(final_data, f)
+    os.replace(tmp_path, TOKEN_FILE)
+    return final_data
 
 def load_tokens():
     if not os.path.exists(TOKEN_FILE): return None
@@ -70,8 +207,20 @@ def load_tokens():
     except:
         return None
 
-def refresh_access_token():
-    tokens = load_tokens()
+@contextmanager
+def token_file_lock():
+    """ Exclusive OS lock shared by every process touching TOKEN_FILE (no-op where fcntl is unavailable) """
+    with open(f"{TOKEN_FILE}.lock", 'w') as lock_file:
+        if fcntl: fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl: fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def is_fresh(tokens):
+    return bool(tokens) and 'access_token' in tokens and datetime.now().timestamp() < tokens.get('expires_at', 0)
+
+def refresh_access_token(tokens):
     if not tokens or 'refresh_token' not in tokens:
         raise Exception("No refresh token found. Please delete whoop_tokens.json and re-run manually.")
         
@@ -89,28 +238,63 @@ def refresh_access_token():
         print(f"CRITICAL: Refresh failed {r.status_code}. Response: {r.text}")
         raise Exception("Token Refresh Failed. Authorization chain broken.")
     
-    new_data = r.json()
-    save_tokens(new_data)
+    new_data = save_tokens(r.json())
     print("✅ Refresh Success.")
-    return new_data['access_token']
+    return new_data
+
+class TokenManager:
+    """
+    Keeps the OAuth token in memory for the life of the process.
+    Disk is only read on first use and on refresh; refreshes run under the
+    OS file lock so parallel threads AND processes share a single rotation.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tokens = None
+
+    def get(self):
+        """ Returns a valid access token, refreshing only if it has expired """
+        tokens = self.tokens
+        if is_fresh(tokens):
+            return tokens['access_token']
+        
+        with self.lock:
+            if self.tokens is None:
+                self.tokens = load_tokens()
+            # 1. First Run logic
+            if not self.tokens:
+                with token_file_lock():
+                    self.tokens = perform_initial_auth()
+            # 2. Check Time
+            if not is_fresh(self.tokens):
+                print("⏳ Token Expired. Refreshing...")
+                self._refresh(self.tokens.get('access_token'))
+            return self.tokens['access_token']
+
+    def invalidate(self, stale_token):
+        """ Called after a 401: refreshes unless someone already replaced stale_token """
+        with self.lock:
+            if self.tokens and self.tokens.get('access_token') != stale_token and is_fresh(self.tokens):
+                return self.tokens['access_token']
+            self._refresh(stale_token)
+            return self.tokens['access_token']
+
+    def _refresh(self, stale_token):
+        with token_file_lock():
+            # Another process may have rotated while we waited: adopt its token instead of
+            # spending the (now invalid) refresh token we hold in memory
+            on_disk = load_tokens()
+            if is_fresh(on_disk) and on_disk['access_token'] != stale_token:
+                print("🔁 Adopted token refreshed by another worker.")
+                self.tokens = on_disk
+                return
+            self.tokens = refresh_access_token(on_disk or self.tokens)
+
+TOKEN_MANAGER = TokenManager()
 
 def get_valid_token():
     """ Determines if we need to refresh or just return current token """
-    tokens = load_tokens()
-    
-    # 1. First Run logic
-    if not tokens:
-        return perform_initial_auth()
-    
-    # 2. Check Time
-    now_ts = datetime.now().timestamp()
-    expires_at = tokens.get('expires_at', 0)
-    
-    if now_ts >= expires_at:
-        print("⏳ Token Expired. Refreshing...")
-        return refresh_access_token()
-    
-    return tokens['access_token']
+    return TOKEN_MANAGER.get()
 
 def perform_initial_auth():
     print("\n⚠️ NO VALID TOKEN FOUND.")
@@ -143,86 +327,284 @@ def perform_initial_auth():
     if r.status_code != 200:
         raise Exception(f"Auth Failed: {r.text}")
 
-    save_tokens(r.json())
-    return r.json()['access_token']
+    return save_tokens(r.json())
 
-def make_request_with_retry(url, params):
+def make_request_with_retry(session, url, params):
     """
     Wrapper to handle 401s (expired tokens) gracefully by refreshing and retrying once.
     """
     token = get_valid_token()
     headers = {'Authorization': f'Bearer {token}'}
     
-    res = requests.get(url, headers=headers, params=params)
+    RATE_LIMITER.acquire()
+    res = session.get(url, headers=headers, params=params)
+    RATE_LIMITER.observe(res.headers)
     
     # CATCH 401: Token expired mid-script or on server?
     if res.status_code == 401:
         print("⚠️ 401 Unauthorized caught. Force-refreshing token and retrying...")
-        token = refresh_access_token()
+        token = TOKEN_MANAGER.invalidate(token)
         headers = {'Authorization': f'Bearer {token}'}
-        res = requests.get(url, headers=headers, params=params)
+        RATE_LIMITER.acquire()
+        res = session.get(url, headers=headers, params=params)
+        RATE_LIMITER.observe(res.headers)
         
     return res
 
-def fetch_all_metrics(start, end):
-    start_str = start.strftime("%Y-%m-%dT%H:%M:%S.000Z")
-    end_str = end.strftime("%Y-%m-%dT%H:%M:%S.000Z")
-    print(f"📡 Whoop V2 Fetch: {start_str} -> {end_str}")
-    
-    combined_data = {}
+def fetch_endpoint(session, key, url, start_str, end_str):
+    """ Walks one endpoint's full pagination chain """
+    params = {'start': start_str, 'end': end_str, 'limit': PAGE_LIMIT}
+    all_records = []
+    next_token = None
+    attempt = 0
     
-    for key, url in ENDPOINTS.items():
-        print(f"   Downloading '{key}'...", end=" ")
-        params = {'start': start_str, 'end': end_str, 'limit': 25} 
+    while True:
+        if next_token:
+            params['nextToken'] = next_token
         
-        try:
-            all_records = []
-            next_token = None
-            
-            while True:
-                if next_token:
-                    params['nextToken'] = next_token
-                
-                # USE THE ROBUST REQUESTER
-                res = make_request_with_retry(url, params)
-                
-                if res.status_code == 429:
-                    print("RATE LIMITED. Sleeping 5s...", end=" ")
-                    time.sleep(5)
-                    continue
-                    
-                if res.status_code != 200:
-                    print(f"❌ Error {res.status_code}: {res.text}")
-                    break
-                    
-                page_data = res.json()
-                records = page_data.get('records', [])
-                all_records.extend(records)
-                
-                next_token = page_data.get('next_token')
-                if not next_token:
-                    break
+        # USE THE ROBUST REQUESTER
+        res = make_request_with_retry(session, url, params)
+        
+        if res.status_code == 429:
+            if attempt >= MAX_RETRIES:
+                raise Exception(f"Still rate limited after {MAX_RETRIES} retries")
+            delay = RATE_LIMITER.backoff(attempt, res.headers)
+            attempt += 1
+            print(f"   [{key}] RATE LIMITED. Backing off {delay:.1f}s (retry {attempt}/{MAX_RETRIES})...")
+            continue
+        attempt = 0
             
-            combined_data[key] = all_records
-            print(f"✅ Got {len(all_records)}")
+        if res.status_code != 200:
+            # Raise instead of returning a partial chain: incremental cursors must not skip pages
+            raise Exception(f"Error {res.status_code}: {res.text}")
             
-        except Exception as e:
-            print(f"⚠️ Exception: {e}")
-            combined_data[key] = []
+        page_data = res.json()
+        records = page_data.get('records', [])
+        all_records.extend(records)
+        
+        next_token = page_data.get('next_token')
+        if not next_token:
+            break
+    
+    return all_records
 
+def to_api_ts(dt):
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+def fetch_all_metrics(start, end, workers=DEFAULT_WORKERS, starts=None, strict=False):
+    """
+    starts: optional {endpoint: datetime} overriding `start` per endpoint (incremental mode)
+    strict: re-raise endpoint failures instead of returning an empty list (backfill checkpoints)
+    """
+    starts = starts or {}
+    start_str = to_api_ts(start)
+    end_str = to_api_ts(end)
+    workers = max(1, min(workers, len(ENDPOINTS)))
+    print(f"📡 Whoop V2 Fetch: {start_str} -> {end_str} ({workers} worker(s))")
+    
+    # Token must exist before workers start, otherwise each would trigger the interactive login
+    get_valid_token()
+    
+    combined_data = {}
+    t0 = time.time()
+    waited_before, throttled_before = RATE_LIMITER.waited, RATE_LIMITER.throttled
+    
+    with get_http_session(workers) as session, ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            key: pool.submit(fetch_endpoint, session, key, url, to_api_ts(starts.get(key, start)), end_str)
+            for key, url in ENDPOINTS.items()
+        }
+        for key, future in futures.items():
+            try:
+                combined_data[key] = future.result()
+                print(f"   ✅ '{key}': Got {len(combined_data[key])}")
+            except Exception as e:
+                print(f"   ⚠️ '{key}' Exception: {e}")
+                if strict: raise
+                combined_data[key] = []
+
+    print(f"⏱️  Whoop fetch finished in {time.time() - t0:.1f}s "
+          f"(rate limiter wait: {RATE_LIMITER.waited - waited_before:.1f}s, 429s: {RATE_LIMITER.throttled - throttled_before})")
     return combined_data
 
 def upload_to_aws(data, start, end):
     s3 = get_s3_client()
     key = f"whoop/whoop_FULL_{start.strftime('%Y%m%d')}_to_{end.strftime('%Y%m%d')}.json"
     
-    s3.put_object(
-        Bucket=BUCKET_NAME, 
-        Key=key, 
-        Body=json.dumps(data), 
-        ContentType='application/json'
-    )
+    etag = biostack_storage.put_json(s3, BUCKET_NAME, key, data)
     print(f"🚀 SUCCESS! Saved: s3://{BUCKET_NAME}/{key}")
+    biostack_storage.register_object(s3, BUCKET_NAME, 'whoop', key, start, end, etag,
+                                     sum(len(v) for v in data.values()))
+    write_lake(s3, data)
+
+def write_lake(s3, data):
+    """ Mirrors each category into the Parquet lake (lake/whoop_<category>/year=/month=/) """
+    for category, records in data.items():
+        try:
+            biostack_lake.write_source(s3, BUCKET_NAME, f"whoop_{category}", records)
+        except Exception as e:
+            print(f"⚠️ Lake write failed for '{category}': {e}")
+
+# --- INCREMENTAL SYNC ---
+
+def parse_api_ts(value):
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+def record_watermark(record):
+    """ Latest timestamp at which Whoop touched this record """
+    return record.get('updated_at') or record.get('created_at') or record.get('start')
+
+def cursor_starts(cursors, default_start):
+    """ Per-endpoint fetch start: cursor minus overlap, or the requested window if never synced """
+    starts = {}
+    for key in ENDPOINTS:
+        if cursors.get(key):
+            starts[key] = parse_api_ts(cursors[key]) - INCREMENTAL_OVERLAP
+        else:
+            starts[key] = default_start
+    return starts
+
+def upsert_records(store, fresh):
+    """ Merges freshly fetched records into the store by record id, returns count of new ids """
+    added = 0
+    for key, records in fresh.items():
+        id_field = RECORD_KEYS[key]
+        by_id = {r.get(id_field): r for r in store.get(key, [])}
+        for r in records:
+            rid = r.get(id_field)
+            if rid is None: continue
+            if rid not in by_id: added += 1
+            by_id[rid] = r
+        store[key] = sorted(by_id.values(), key=lambda r: r.get('start') or r.get('created_at') or '')
+    return added
+
+def advance_cursors(cursors, fresh):
+    for key, records in fresh.items():
+        marks = [m for m in (record_watermark(r) for r in records) if m]
+        if marks:
+            cursors[key] = max([cursors[key]] + marks if cursors.get(key) else marks)
+    return cursors
+
+def incremental_sync(start, end, workers=DEFAULT_WORKERS):
+    """ Fetches only what changed since the last run and upserts it into STORE_KEY """
+    s3 = get_s3_client()
+    cursors = biostack_storage.read_json(s3, BUCKET_NAME, CURSOR_KEY) or {}
+    store = biostack_storage.read_json(s3, BUCKET_NAME, STORE_KEY) or {key: [] for key in ENDPOINTS}
+    
+    if cursors:
+        print(f"🔖 Cursors: {cursors}")
+    else:
+        print("🔖 No cursors yet. Seeding store from the requested window.")
+    
+    fresh = fetch_all_metrics(start, end, workers=workers, starts=cursor_starts(cursors, start))
+    added = upsert_records(store, fresh)
+    advance_cursors(cursors, fresh)
+    
+    # Store first, cursors second: a crash in between only causes a harmless re-fetch
+    etag = biostack_storage.put_json(s3, BUCKET_NAME, STORE_KEY, store)
+    biostack_storage.put_json(s3, BUCKET_NAME, CURSOR_KEY, cursors)
+    print(f"🚀 SUCCESS! Upserted {sum(len(v) for v in fresh.values())} records ({added} new) into s3://{BUCKET_NAME}/{STORE_KEY}")
+    
+    days = [d for d in (biostack_storage.record_day(r) for v in store.values() for r in v) if d]
+    if days:
+        biostack_storage.register_object(s3, BUCKET_NAME, 'whoop', STORE_KEY, min(days), max(days), etag,
+                                         sum(len(v) for v in store.values()))
+    write_lake(s3, fresh)
+
+# --- BACKFILL (CHUNKED + RESUMABLE) ---
+
+def month_chunks(start, end):
+    """ Splits [start, end] into calendar-month windows """
+    chunks = []
+    cursor = start
+    while cursor <= end:
+        if cursor.month == 12:
+            next_month = cursor.replace(year=cursor.year + 1, month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
+        else:
+            next_month = cursor.replace(month=cursor.month + 1, day=1, hour=0, minute=0, second=0, microsecond=0)
+        chunks.append((cursor, min(next_month - timedelta(seconds=1), end)))
+        cursor = next_month
+    return chunks
+
+def load_checkpoint(path, start, end):
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            return json.load(f)
+    return {'start': to_api_ts(start), 'end': to_api_ts(end), 'chunks': {}}
+
+def write_checkpoint(path, manifest):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+def backfill(start, end, workers=DEFAULT_WORKERS, resume_end=False):
+    """
+    Fetches monthly chunks concurrently. Every finished chunk is written to disk and
+    recorded in manifest.json, so re-running the same command skips completed months.
+    The run is keyed by `start` only; with resume_end (no --end given) an existing run
+    keeps the end saved in its manifest, so a restart on a later day still resumes.
+    Returns (data, end) with the end actually used; data is None if a chunk failed.
+    """
+    run_dir = os.path.join(BACKFILL_DIR, f"from_{start.strftime('%Y%m%d')}")
+    os.makedirs(run_dir, exist_ok=True)
+    manifest_path = os.path.join(run_dir, 'manifest.json')
+    manifest = load_checkpoint(manifest_path, start, end)
+    saved_end = parse_api_ts(manifest['end'])
+    if resume_end:
+        end = saved_end
+    elif to_api_ts(end) != manifest['end']:
+        # New end: chunks from the earlier end's month on may be cut short, refetch them
+        stale_from = min(end, saved_end).strftime('%Y-%m')
+        manifest['chunks'] = {label: c for label, c in manifest['chunks'].items() if label < stale_from}
+        manifest['end'] = to_api_ts(end)
+        write_checkpoint(manifest_path, manifest)
+    print(f"🗂️  Backfill run {run_dir}: {to_api_ts(start)[:10]} -> {to_api_ts(end)[:10]}")
+    manifest_lock = threading.Lock()
+    
+    chunks = month_chunks(start, end)
+    pending = [(cs, ce) for cs, ce in chunks if cs.strftime('%Y-%m') not in manifest['chunks']]
+    print(f"🗂️  Backfill: {len(chunks)} monthly chunks, {len(chunks) - len(pending)} already checkpointed.")
+    
+    # Token must exist before workers start (interactive login on first run)
+    get_valid_token()
+    
+    def run_chunk(chunk_start, chunk_end):
+        label = chunk_start.strftime('%Y-%m')
+        data = fetch_all_metrics(chunk_start, chunk_end, workers=1, strict=True)
+        chunk_file = f"chunk_{label}.json"
+        with open(os.path.join(run_dir, chunk_file), 'w') as f:
+            json.dump(data, f)
+        with manifest_lock:
+            manifest['chunks'][label] = {
+                'file': chunk_file,
+                'records': {k: len(v) for k, v in data.items()},
+                'done_at': datetime.now(timezone.utc).isoformat()
+            }
+            write_checkpoint(manifest_path, manifest)
+        return label
+    
+    failed = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(run_chunk, cs, ce): cs.strftime('%Y-%m') for cs, ce in pending}
+        for future, label in futures.items():
+            try:
+                future.result()
+                print(f"   💾 Checkpointed {label} ({len(manifest['chunks'])}/{len(chunks)})")
+            except Exception as e:
+                print(f"   ❌ Chunk {label} failed: {e}")
+                failed.append(label)
+    
+    if failed:
+        print(f"⚠️ {len(failed)} chunk(s) failed: {failed}. Re-run the same command to resume.")
+        return None, end
+    
+    # Merge all checkpoints (dedupe: chunk boundaries can return the same record twice)
+    combined = {key: [] for key in ENDPOINTS}
+    for label in sorted(manifest['chunks']):
+        with open(os.path.join(run_dir, manifest['chunks'][label]['file']), 'r') as f:
+            upsert_records(combined, json.load(f))
+    return combined, end
 
 def main():
     args = get_args()
@@ -241,7 +623,15 @@ def main():
     end_date = end_date.replace(hour=23, minute=59, second=59).astimezone(timezone.utc)
     
     try:
-        data = fetch_all_metrics(start_date, end_date)
+        if args.incremental:
+            incremental_sync(start_date, end_date, workers=args.workers)
+            return
+        if args.backfill:
+            data, end_date = backfill(start_date, end_date, workers=args.workers, resume_end=not args.end)
+            if data is not None:
+                upload_to_aws(data, start_date, end_date)
+            return
+        data = fetch_all_metrics(start_date, end_date, workers=args.workers)
         upload_to_aws(data, start_date, end_date)
     except Exception as e:
         print(f"Script Error: {e}")
@@ -7,22 +7,32 @@
 #   ./run_all.sh                        # Uses default template & 7 days
 #   ./run_all.sh --template custom.txt  # Uses specific prompt template
 #   ./run_all.sh --days 14              # Fetches 2 weeks of data
+#   ./run_all.sh --job 7 --job 30 --job 7:templates/preston_coach.txt
+#                                       # Batch: one brief per job from a single Analyst pass
 # ------------------------------------------------------------------
 
 # 1. Set Defaults
 TEMPLATE="templates/default_coach.txt"
 DAYS=7
+JOBS=()
 
 # 2. Parse Arguments
 while [[ "$#" -gt 0 ]]; do
     case $1 in
         -t|--template) TEMPLATE="$2"; shift ;;
         -d|--days) DAYS="$2"; shift ;;
+        -j|--job) JOBS+=(--job "$2"); shift ;;
         *) echo "❌ Unknown parameter passed: $1"; exit 1 ;;
     esac
     shift
 done
 
+# Gatherers must cover the widest batch job
+for ((i = 1; i < ${#JOBS[@]}; i += 2)); do
+    JOB_DAYS="${JOBS[$i]%%:*}"
+    if [ "$JOB_DAYS" -gt "$DAYS" ]; then DAYS="$JOB_DAYS"; fi
+done
+
 # 3. Verify Template Exists
 if [ ! -f "$TEMPLATE" ]; then
     echo "❌ Error: Template file not found at '$TEMPLATE'"
@@ -60,11 +70,11 @@ python biostack_vitals.py --days $DAYS
 echo ""
 echo "5️⃣  [Analyst] Generating Contextual Prompt..."
 # Passing the template argument to the python script
-python biostack_analyst.py --days $DAYS --template "$TEMPLATE"
+python biostack_analyst.py --days $DAYS --template "$TEMPLATE" "${JOBS[@]}"
 
 # 7. Delivery
 echo ""
-echo "6️⃣  [Drive] Uploading Brief to Cloud..."
+echo "6️⃣  [Drive] Uploading Brief(s) to Cloud..."
 python biostack_drive.py --days $DAYS
 
 echo ""